@@ -0,0 +1,28 @@
+"""Threaded WSGI serving mode under uvicorn.
+
+    uvicorn asgi:application --host 127.0.0.1 --port 5000 --lifespan off
+
+One process. The Flask app stays a WSGI app and runs through uvicorn's WSGI
+adapter on a pool of PANEL_THREADS threads (default 64): at most that many
+requests are handled at once, further ones wait for a free thread. Commands a
+request waits for (sysexec.run) hold its thread, including the subprocess
+time; slow host changes (sshd restart, Outline unit start, Xray regeneration)
+are handed off with sysexec.spawn and do not.
+"""
+from uvicorn.middleware.wsgi import WSGIMiddleware
+from app import create_app
+from schema import init_db
+import os
+
+PANEL_THREADS = int(os.getenv('PANEL_THREADS', '64'))
+
+# Every request thread may hold a pooled SQLite connection
+flask_app = create_app({
+    'SQLALCHEMY_ENGINE_OPTIONS': {'pool_size': PANEL_THREADS, 'max_overflow': 0},
+})
+
+# Columns added since the database was created, before the first request
+with flask_app.app_context():
+    init_db()
+
+application = WSGIMiddleware(flask_app, workers=PANEL_THREADS)
@@ -0,0 +1,225 @@
+from flask import current_app
+from models import db
+from snapshot import SNAPSHOTS, invalidate
+from datetime import datetime
+import click
+import gzip
+import os
+import shutil
+import sqlite3
+
+# Online backups of the panel database. The copy is made with SQLite's backup
+# API a few pages at a time, sleeping between steps, so gunicorn workers keep
+# writing while it runs: each step holds the read lock only for PAGES_PER_STEP
+# pages. A write between two steps makes SQLite restart the copy; after
+# MAX_RESTARTS the rest is copied in one step (a few ms for a panel-sized
+# database) so a busy panel cannot starve the backup.
+#
+# Backups are checked with PRAGMA quick_check, optionally gzipped, and rotated
+# (newest BACKUP_KEEP are kept).
+
+BACKUP_PREFIX = 'ssh_panel-'
+BACKUP_KEEP = 14
+PAGES_PER_STEP = 256
+STEP_SLEEP = 0.005
+MAX_RESTARTS = 5
+# How long a step waits for a writer to finish before giving up
+BUSY_TIMEOUT = 30
+
+
+class BackupError(Exception):
+    """Backup or restore that cannot be done"""
+
+
+class _TooManyRestarts(Exception):
+    pass
+
+
+def database_path():
+    """Filesystem path of the panel database"""
+    url = db.engine.url
+    if url.get_backend_name() != 'sqlite' or not url.database or url.database == ':memory:':
+        raise BackupError(f'Only file-based SQLite databases can be backed up, not {url.render_as_string()}')
+    return url.database
+
+
+def backup_dir():
+    return current_app.config['BACKUP_DIR']
+
+
+def _copy(source, target, pages=PAGES_PER_STEP, sleep=STEP_SLEEP):
+    """Paged backup of one connection into another; returns the restart count"""
+    state = {'remaining': None, 'restarts': 0}
+
+    def progress(status, remaining, total):
+        # remaining only grows again when a writer made SQLite start over
+        if state['remaining'] is not None and remaining > state['remaining']:
+            state['restarts'] += 1
+            if state['restarts'] > MAX_RESTARTS:
+                raise _TooManyRestarts()
+        state['remaining'] = remaining
+
+    try:
+        source.backup(target, pages=pages, progress=progress, sleep=sleep)
+    except _TooManyRestarts:
+        source.backup(target, pages=-1)
+    return state['restarts']
+
+
+def _quick_check(path):
+    connection = sqlite3.connect(path)
+    try:
+        result = connection.execute('PRAGMA quick_check').fetchone()[0]
+    finally:
+        connection.close()
+    if result != 'ok':
+        raise BackupError(f'{path} failed the integrity check: {result}')
+
+
+def _publish(partial, stem, suffix):
+    """Give a finished file its final name without replacing an existing backup"""
+    # Backups made within the same second get -2, -3, ...
+    for number in range(1, 1000):
+        path = f"{stem}{f'-{number}' if number > 1 else ''}{suffix}"
+        try:
+            os.link(partial, path)
+        except FileExistsError:
+            continue
+        os.remove(partial)
+        return path
+    raise BackupError(f'Too many backups named {stem}*{suffix}')
+
+
+def backup_database(directory=None, compress=True, keep=BACKUP_KEEP, label=''):
+    """Write a consistent copy of the live database; returns (path, restarts)"""
+    directory = directory or backup_dir()
+    os.makedirs(directory, mode=0o700, exist_ok=True)
+    stem = os.path.join(directory, f"{BACKUP_PREFIX}{datetime.now():%Y%m%d-%H%M%S}{'-' + label if label else ''}")
+    suffix = '.db'
+    # Per process, so two backups started together never share a scratch file
+    partial = f'{stem}{suffix}.{os.getpid()}.partial'
+
+    source = sqlite3.connect(database_path(), timeout=BUSY_TIMEOUT)
+    target = sqlite3.connect(partial)
+    try:
+        restarts = _copy(source, target)
+    finally:
+        target.close()
+        source.close()
+
+    try:
+        _quick_check(partial)
+        if compress:
+            compressed = f'{stem}.db.gz.{os.getpid()}.partial'
+            with open(partial, 'rb') as f_in, gzip.open(compressed, 'wb', compresslevel=6) as f_out:
+                shutil.copyfileobj(f_in, f_out, 1024 * 1024)
+            os.remove(partial)
+            partial, suffix = compressed, '.db.gz'
+        os.chmod(partial, 0o600)
+        # Only complete, checked files ever carry the final name
+        path = _publish(partial, stem, suffix)
+    finally:
+        if os.path.exists(partial):
+            os.remove(partial)
+
+    if keep:
+        rotate_backups(directory, keep)
+    return path, restarts
+
+
+def list_backups(directory=None):
+    """[(path, size, mtime)], newest first"""
+    directory = directory or backup_dir()
+    if not os.path.isdir(directory):
+        return []
+    backups = []
+    for entry in os.scandir(directory):
+        if entry.name.startswith(BACKUP_PREFIX) and entry.name.endswith(('.db', '.db.gz')):
+            stat = entry.stat()
+            backups.append((entry.path, stat.st_size, stat.st_mtime))
+    return sorted(backups, key=lambda backup: (backup[2], backup[0]), reverse=True)
+
+
+def rotate_backups(directory, keep):
+    """Delete all but the newest `keep` backups; returns the deleted paths"""
+    removed = [path for path, _, _ in list_backups(directory)[keep:]]
+    for path in removed:
+        os.remove(path)
+    return removed
+
+
+def restore_database(backup_path, safety_backup=True):
+    """Replace the live database contents with a backup; returns the safety backup path"""
+    if not os.path.isfile(backup_path):
+        raise BackupError(f'{backup_path} does not exist')
+
+    plain = backup_path
+    if backup_path.endswith('.gz'):
+        plain = os.path.join(os.path.dirname(database_path()), '.restore.db')
+        with gzip.open(backup_path, 'rb') as f_in, open(plain, 'wb') as f_out:
+            shutil.copyfileobj(f_in, f_out, 1024 * 1024)
+
+    try:
+        _quick_check(plain)
+        saved = backup_database(label='pre-restore', keep=0)[0] if safety_backup else None
+
+        # Copied through the backup API into the open database rather than
+        # replacing the file, so connections held by running workers see the
+        # restored data instead of a deleted inode
+        db.engine.dispose()
+        source = sqlite3.connect(plain)
+        target = sqlite3.connect(database_path(), timeout=BUSY_TIMEOUT)
+        try:
+            source.backup(target)
+        finally:
+            target.close()
+            source.close()
+    finally:
+        if plain != backup_path and os.path.exists(plain):
+            os.remove(plain)
+
+    for name in SNAPSHOTS:
+        invalidate(name)
+    return saved
+
+
+@click.group('backup')
+def backup_cli():
+    """Back up and restore the panel database"""
+
+
+@backup_cli.command('create')
+@click.option('--dir', 'directory', help='Backup directory (default: BACKUP_DIR, /opt/ssh-panel/backups)')
+@click.option('--no-compress', is_flag=True, help='Keep the copy as a plain .db file')
+@click.option('--keep', default=BACKUP_KEEP, show_default=True, help='Backups to keep, 0 keeps all')
+def create_backup_command(directory, no_compress, keep):
+    """Back up the database while the panel keeps running"""
+    try:
+        path, restarts = backup_database(directory, compress=not no_compress, keep=keep)
+    except (BackupError, OSError, sqlite3.Error) as e:
+        raise click.ClickException(str(e))
+    click.echo(f'Backup written to {path} ({os.path.getsize(path) / 1024:.0f} KB'
+               f'{f", restarted {restarts}x by concurrent writes" if restarts else ""})')
+
+
+@backup_cli.command('list')
+@click.option('--dir', 'directory', help='Backup directory')
+def list_backups_command(directory):
+    """List backups, newest first"""
+    for path, size, mtime in list_backups(directory):
+        click.echo(f'{datetime.fromtimestamp(mtime):%Y-%m-%d %H:%M:%S}  {size / 1024:>8.0f} KB  {path}')
+
+
+@backup_cli.command('restore')
+@click.argument('path', type=click.Path(exists=True, dir_okay=False))
+@click.option('--yes', is_flag=True, help='Do not ask for confirmation')
+def restore_backup_command(path, yes):
+    """Restore a backup (the current database is backed up first)"""
+    if not yes:
+        click.confirm(f'Replace all panel data with {path}?', abort=True)
+    try:
+        saved = restore_database(path)
+    except (BackupError, OSError, sqlite3.Error) as e:
+        raise click.ClickException(str(e))
+    click.echo(f'Restored {path}; previous data saved to {saved}')
+    click.echo('Run "flask --app app reconcile --apply" to bring host accounts in line with the restored data')
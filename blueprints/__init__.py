@@ -0,0 +1,9 @@
+from blueprints.main import bp as main_bp
+from blueprints.ssh import bp as ssh_bp
+from blueprints.vmess import bp as vmess_bp
+from blueprints.outline import bp as outline_bp
+from blueprints.export import bp as export_bp
+from blueprints.api import bp as api_bp
+from blueprints.profiles import bp as profiles_bp
+
+ALL_BLUEPRINTS = [main_bp, ssh_bp, vmess_bp, outline_bp, export_bp, api_bp, profiles_bp]
@@ -0,0 +1,348 @@
+from flask import Blueprint, current_app, g, jsonify, request
+from werkzeug.datastructures import MultiDict
+from werkzeug.exceptions import MethodNotAllowed, NotFound
+from models import db, SSHUser, VMessUser, OutlineUser
+from tokens import token_required, rate_limiter, rate_limited
+from bulk import run_bulk
+from links import vmess_user_link
+from helpers import ssh_credentials_error
+from ports import PortRangeExhausted
+from blueprints.ssh import create_ssh_account
+from blueprints.vmess import create_vmess_account, get_vmess_settings
+from blueprints.outline import create_outline_account
+from datetime import datetime
+import base64
+import urllib.parse
+
+# JSON API for automation, authenticated with API tokens (see tokens.py).
+# Every endpoint is a handler taking (body, query, **url args) and returning
+# (payload, status), so POST /api/v1/batch can run many of them in one request.
+
+bp = Blueprint('api', __name__, url_prefix='/api/v1')
+
+PAGE_SIZE = 100
+MAX_PAGE_SIZE = 1000
+MAX_BATCH = 100
+
+# endpoint -> handler, used by the batch dispatcher
+HANDLERS = {}
+
+
+def json_object(value):
+    return value if isinstance(value, dict) else {}
+
+
+class ApiError(Exception):
+    def __init__(self, message, status=400):
+        super().__init__(message)
+        self.message = message
+        self.status = status
+
+
+def call_handler(handler, body, query, view_args):
+    """Run a handler, turning errors into JSON payloads"""
+    try:
+        return handler(body, query, **view_args)
+    except ApiError as e:
+        db.session.rollback()
+        return {'error': e.message}, e.status
+    except Exception as e:
+        db.session.rollback()
+        current_app.logger.exception(f'API handler {handler.__name__} failed: {e}')
+        return {'error': 'Internal error'}, 500
+
+
+def api_route(rule, methods):
+    """Register a handler as a token-protected route and for batch dispatch"""
+    def decorator(handler):
+        @token_required
+        def view(**view_args):
+            body = json_object(request.get_json(silent=True))
+            payload, status = call_handler(handler, body, request.args, view_args)
+            return jsonify(payload), status
+
+        bp.add_url_rule(rule, handler.__name__, view, methods=methods)
+        HANDLERS[f'{bp.name}.{handler.__name__}'] = handler
+        return handler
+    return decorator
+
+
+def int_field(source, key, default=None, minimum=None):
+    value = source.get(key, default)
+    if value is None:
+        raise ApiError(f'"{key}" is required')
+    try:
+        value = int(value)
+    except (TypeError, ValueError):
+        raise ApiError(f'"{key}" must be an integer')
+    if minimum is not None and value < minimum:
+        raise ApiError(f'"{key}" must be at least {minimum}')
+    return value
+
+
+def number_field(source, key, default=0):
+    try:
+        value = float(source.get(key, default))
+    except (TypeError, ValueError):
+        raise ApiError(f'"{key}" must be a number')
+    if value < 0:
+        raise ApiError(f'"{key}" must not be negative')
+    return value
+
+
+def text_field(source, key):
+    value = source.get(key)
+    if not isinstance(value, str) or not value.strip():
+        raise ApiError(f'"{key}" is required')
+    return value.strip()
+
+
+def encode_cursor(last_id):
+    return base64.urlsafe_b64encode(str(last_id).encode()).decode().rstrip('=')
+
+
+def decode_cursor(cursor):
+    if not cursor:
+        return 0
+    try:
+        return int(base64.urlsafe_b64decode(cursor + '=' * (-len(cursor) % 4)).decode())
+    except ValueError:
+        raise ApiError('Invalid cursor')
+
+
+def paginate(model, serialize, query):
+    """Keyset pagination on id: ?limit=&cursor= (plus optional ?status=)"""
+    limit = min(int_field(query, 'limit', PAGE_SIZE, minimum=1), MAX_PAGE_SIZE)
+    stmt = (db.select(model)
+            .where(model.id > decode_cursor(query.get('cursor')))
+            .order_by(model.id)
+            .limit(limit + 1))
+    if query.get('status'):
+        stmt = stmt.where(model.status_expression(datetime.utcnow()) == query['status'])
+
+    users = db.session.scalars(stmt).all()
+    page = users[:limit]
+    return {
+        'items': [serialize(user) for user in page],
+        'next_cursor': encode_cursor(page[-1].id) if len(users) > limit else None,
+    }, 200
+
+
+def get_or_404(model, user_id):
+    user = db.session.get(model, user_id)
+    if user is None:
+        raise ApiError('User not found', 404)
+    return user
+
+
+def bulk_result(kind, action, user_id, **options):
+    """Run a one-row bulk action; 502 when the host side did not follow"""
+    result = run_bulk(kind, action, ids=[user_id], **options)[0]
+    return result, 200 if result['ok'] else 502
+
+
+def serialize_ssh(user):
+    return {
+        'id': user.id,
+        'username': user.username,
+        'password': user.password,
+        'expiry_date': user.expiry_date.isoformat(),
+        'status': user.get_status(),
+        'max_connections': user.max_connections,
+        'notes': user.notes,
+        'rate_limit_mbps': user.rate_limit_mbps,
+        'created_at': user.created_at.isoformat(),
+    }
+
+
+def vmess_serializer():
+    settings = get_vmess_settings()
+
+    def serialize(user):
+        return {
+            'id': user.id,
+            'name': user.name,
+            'uuid': user.uuid,
+            'expiry_date': user.expiry_date.isoformat(),
+            'status': user.get_status(),
+            'data_limit_gb': user.data_limit_gb,
+            'used_data_gb': user.used_data_gb,
+            'rate_limit_mbps': user.rate_limit_mbps,
+            'link': vmess_user_link(user, settings),
+            'created_at': user.created_at.isoformat(),
+        }
+    return serialize
+
+
+def serialize_outline(user):
+    return {
+        'id': user.id,
+        'name': user.name,
+        'port': user.port,
+        'method': user.method,
+        'access_key': user.access_key,
+        'status': user.get_status(),
+        'data_limit_gb': user.data_limit_gb,
+        'used_data_gb': user.used_data_gb,
+        'rate_limit_mbps': user.rate_limit_mbps,
+        'created_at': user.created_at.isoformat(),
+    }
+
+
+# SSH
+
+@api_route('/ssh/users', methods=['GET'])
+def ssh_list(body, query):
+    return paginate(SSHUser, serialize_ssh, query)
+
+
+@api_route('/ssh/users', methods=['POST'])
+def ssh_create(body, query):
+    username = text_field(body, 'username')
+    password = text_field(body, 'password')
+    error = ssh_credentials_error(username, password)
+    if error:
+        raise ApiError(error)
+    days = int_field(body, 'days', 30, minimum=1)
+    max_connections = int_field(body, 'max_connections', 2, minimum=1)
+    rate_limit = int_field(body, 'rate_limit_mbps', 0, minimum=0)
+
+    if SSHUser.query.filter_by(username=username).first():
+        raise ApiError(f'User {username} already exists', 409)
+    user, error = create_ssh_account(username, password, days, max_connections, body.get('notes', ''), rate_limit)
+    if error:
+        raise ApiError(error, 502)
+    return serialize_ssh(user), 201
+
+
+@api_route('/ssh/users/<int:user_id>/extend', methods=['POST'])
+def ssh_extend(body, query, user_id):
+    get_or_404(SSHUser, user_id)
+    return bulk_result('ssh', 'extend', user_id, days=int_field(body, 'days', minimum=1))
+
+
+@api_route('/ssh/users/<int:user_id>/limit', methods=['POST'])
+def ssh_limit(body, query, user_id):
+    get_or_404(SSHUser, user_id)
+    return bulk_result('ssh', 'limit', user_id, mbps=int_field(body, 'rate_limit_mbps', minimum=0))
+
+
+@api_route('/ssh/users/<int:user_id>', methods=['DELETE'])
+def ssh_delete(body, query, user_id):
+    get_or_404(SSHUser, user_id)
+    return bulk_result('ssh', 'delete', user_id)
+
+
+# VMess
+
+@api_route('/vmess/users', methods=['GET'])
+def vmess_list(body, query):
+    return paginate(VMessUser, vmess_serializer(), query)
+
+
+@api_route('/vmess/users', methods=['POST'])
+def vmess_create(body, query):
+    name = text_field(body, 'name')
+    if VMessUser.query.filter_by(name=name).first():
+        raise ApiError(f'User {name} already exists', 409)
+    try:
+        user = create_vmess_account(name, int_field(body, 'data_limit_gb', 0, minimum=0),
+                                    int_field(body, 'days', 30, minimum=1),
+                                    int_field(body, 'rate_limit_mbps', 0, minimum=0))
+    except ValueError as e:
+        raise ApiError(str(e))
+    return vmess_serializer()(user), 201
+
+
+@api_route('/vmess/users/<int:user_id>/extend', methods=['POST'])
+def vmess_extend(body, query, user_id):
+    get_or_404(VMessUser, user_id)
+    return bulk_result('vmess', 'extend', user_id, days=int_field(body, 'days', minimum=1))
+
+
+@api_route('/vmess/users/<int:user_id>/limit', methods=['POST'])
+def vmess_limit(body, query, user_id):
+    get_or_404(VMessUser, user_id)
+    return bulk_result('vmess', 'limit', user_id, mbps=int_field(body, 'rate_limit_mbps', minimum=0))
+
+
+@api_route('/vmess/users/<int:user_id>', methods=['DELETE'])
+def vmess_delete(body, query, user_id):
+    get_or_404(VMessUser, user_id)
+    return bulk_result('vmess', 'delete', user_id)
+
+
+# Outline (no expiry date, so no extend)
+
+@api_route('/outline/users', methods=['GET'])
+def outline_list(body, query):
+    return paginate(OutlineUser, serialize_outline, query)
+
+
+@api_route('/outline/users', methods=['POST'])
+def outline_create(body, query):
+    name = text_field(body, 'name')
+    try:
+        user = create_outline_account(name, number_field(body, 'data_limit_gb'),
+                                      int_field(body, 'rate_limit_mbps', 0, minimum=0))
+    except PortRangeExhausted as e:
+        raise ApiError(str(e), 503)
+    except ValueError as e:
+        raise ApiError(str(e))
+    return serialize_outline(user), 201
+
+
+@api_route('/outline/users/<int:user_id>/limit', methods=['POST'])
+def outline_limit(body, query, user_id):
+    get_or_404(OutlineUser, user_id)
+    return bulk_result('outline', 'limit', user_id, mbps=int_field(body, 'rate_limit_mbps', minimum=0))
+
+
+@api_route('/outline/users/<int:user_id>', methods=['DELETE'])
+def outline_delete(body, query, user_id):
+    get_or_404(OutlineUser, user_id)
+    return bulk_result('outline', 'delete', user_id)
+
+
+# Batch
+
+@bp.route('/batch', methods=['POST'])
+@token_required
+def batch():
+    """Run up to MAX_BATCH API calls in one request; each counts against the rate limit"""
+    calls = json_object(request.get_json(silent=True)).get('requests')
+    if not isinstance(calls, list) or not calls:
+        return jsonify({'error': '"requests" must be a non-empty list'}), 400
+    if len(calls) > MAX_BATCH:
+        return jsonify({'error': f'At most {MAX_BATCH} requests per batch'}), 400
+
+    # The batch call itself was charged one unit by token_required
+    if len(calls) > 1:
+        allowed, _, retry_after = rate_limiter.take(g.api_token_id, g.api_rate_limit, len(calls) - 1)
+        if not allowed:
+            return rate_limited(retry_after)
+
+    adapter = current_app.url_map.bind('localhost')
+    responses = []
+    for item in calls:
+        if not isinstance(item, dict):
+            responses.append({'status': 400, 'body': {'error': 'Each request must be an object'}})
+            continue
+        path, _, query_string = str(item.get('path', '')).partition('?')
+        try:
+            endpoint, view_args = adapter.match(bp.url_prefix + path, method=str(item.get('method', 'GET')).upper())
+        except NotFound:
+            endpoint, view_args = None, {}
+        except MethodNotAllowed:
+            responses.append({'status': 405, 'body': {'error': 'Method not allowed'}})
+            continue
+
+        handler = HANDLERS.get(endpoint)
+        if handler is None:
+            responses.append({'status': 404, 'body': {'error': 'Not found'}})
+            continue
+        query = MultiDict(urllib.parse.parse_qsl(query_string))
+        payload, status = call_handler(handler, json_object(item.get('body')), query, view_args)
+        responses.append({'status': status, 'body': payload})
+
+    return jsonify({'responses': responses})
@@ -0,0 +1,176 @@
+from flask import Blueprint, Response, abort, request, stream_with_context
+from flask_login import login_required
+from models import db, SSHUser, VMessUser, OutlineUser
+from helpers import make_qr_png
+from links import ssh_config_text, ssh_link, vmess_user_link
+from blueprints.vmess import get_vmess_settings
+from werkzeug.utils import secure_filename
+from sqlalchemy.orm import Session
+from datetime import datetime
+import csv
+import io
+import json
+import zipfile
+
+bp = Blueprint('export', __name__)
+
+# Rows are read in keyset pages (id > last id, PAGE_SIZE at a time) and written
+# out as they are produced, so an export of any size starts immediately and
+# uses constant memory. Each page is its own short read transaction: a slow
+# download never holds the SQLite lock that writers wait for.
+PAGE_SIZE = 500
+
+EXPORT_FIELDS = ['type', 'name', 'secret', 'expiry_date', 'status',
+                 'data_limit_gb', 'used_data_gb', 'port', 'link']
+
+ACCOUNT_TYPES = ['ssh', 'vmess', 'outline']
+
+
+def _stream(model):
+    """Every row of model in id order, one query and transaction per page"""
+    last_id = 0
+    while True:
+        # The session is closed before the page is written out; the rows stay
+        # loaded (the models have no relationships to lazy-load)
+        with Session(db.engine) as session:
+            page = session.scalars(
+                db.select(model).where(model.id > last_id).order_by(model.id).limit(PAGE_SIZE)).all()
+        if not page:
+            return
+        yield from page
+        last_id = page[-1].id
+
+
+def iter_accounts(kinds, server_ip):
+    """Yield (kind, user id, export row, config text) for every account"""
+    if 'ssh' in kinds:
+        for user in _stream(SSHUser):
+            yield 'ssh', user.id, {
+                'type': 'ssh', 'name': user.username, 'secret': user.password,
+                'expiry_date': user.expiry_date.isoformat(), 'status': user.get_status(),
+                'data_limit_gb': '', 'used_data_gb': '', 'port': 22,
+                'link': ssh_link(user, server_ip),
+            }, ssh_config_text(user, server_ip)
+
+    if 'vmess' in kinds:
+        settings = get_vmess_settings()
+        for user in _stream(VMessUser):
+            link = vmess_user_link(user, settings)
+            yield 'vmess', user.id, {
+                'type': 'vmess', 'name': user.name, 'secret': user.uuid,
+                'expiry_date': user.expiry_date.isoformat(), 'status': user.get_status(),
+                'data_limit_gb': user.data_limit_gb, 'used_data_gb': user.used_data_gb,
+                'port': settings['port'], 'link': link,
+            }, link + '\n'
+
+    if 'outline' in kinds:
+        for user in _stream(OutlineUser):
+            yield 'outline', user.id, {
+                'type': 'outline', 'name': user.name, 'secret': user.password,
+                'expiry_date': '', 'status': user.get_status(),
+                'data_limit_gb': user.data_limit_gb, 'used_data_gb': user.used_data_gb,
+                'port': user.port, 'link': user.access_key,
+            }, user.access_key + '\n'
+
+
+def _selected_kinds(kind):
+    if kind == 'all':
+        return ACCOUNT_TYPES
+    if kind not in ACCOUNT_TYPES:
+        abort(404)
+    return [kind]
+
+
+def _download(generator, mimetype, filename):
+    return Response(stream_with_context(generator), mimetype=mimetype,
+                    headers={'Content-Disposition': f'attachment; filename={filename}'})
+
+
+def _stamp():
+    return datetime.utcnow().strftime('%Y%m%d-%H%M%S')
+
+
+@bp.route('/export/<string:kind>.csv')
+@login_required
+def export_csv(kind):
+    """All accounts of a type (or 'all') as CSV"""
+    kinds = _selected_kinds(kind)
+    server_ip = request.host.split(':')[0]
+
+    def generate():
+        line = io.StringIO()
+        writer = csv.DictWriter(line, fieldnames=EXPORT_FIELDS)
+        writer.writeheader()
+        for _, _, row, _ in iter_accounts(kinds, server_ip):
+            writer.writerow(row)
+            # Flush roughly every 64 KB rather than per row
+            if line.tell() > 65536:
+                yield line.getvalue()
+                line.seek(0)
+                line.truncate()
+        yield line.getvalue()
+
+    return _download(generate(), 'text/csv', f'{kind}-accounts-{_stamp()}.csv')
+
+
+@bp.route('/export/<string:kind>.jsonl')
+@login_required
+def export_jsonl(kind):
+    """All accounts of a type (or 'all') as JSON lines"""
+    kinds = _selected_kinds(kind)
+    server_ip = request.host.split(':')[0]
+
+    def generate():
+        chunk = []
+        for _, _, row, _ in iter_accounts(kinds, server_ip):
+            chunk.append(json.dumps(row) + '\n')
+            if len(chunk) >= PAGE_SIZE:
+                yield ''.join(chunk)
+                chunk = []
+        yield ''.join(chunk)
+
+    return _download(generate(), 'application/x-ndjson', f'{kind}-accounts-{_stamp()}.jsonl')
+
+
+class _ZipStream(io.RawIOBase):
+    """Write-only sink for ZipFile; bytes are drained after every member"""
+
+    def __init__(self):
+        self._chunks = []
+
+    def writable(self):
+        return True
+
+    def write(self, data):
+        self._chunks.append(bytes(data))
+        return len(data)
+
+    def drain(self):
+        data = b''.join(self._chunks)
+        self._chunks = []
+        return data
+
+
+@bp.route('/export/<string:kind>.zip')
+@login_required
+def export_zip(kind):
+    """Per-user config files plus QR PNGs (skip QR with ?qr=0)"""
+    kinds = _selected_kinds(kind)
+    server_ip = request.host.split(':')[0]
+    with_qr = request.args.get('qr', '1') != '0'
+
+    def generate():
+        sink = _ZipStream()
+        # ZipFile falls back to data descriptors on a non-seekable sink
+        with zipfile.ZipFile(sink, 'w', compression=zipfile.ZIP_DEFLATED) as archive:
+            for account_type, user_id, row, config in iter_accounts(kinds, server_ip):
+                # Outline names are not unique, the id keeps member names apart
+                stem = f"{account_type}/{user_id}-{secure_filename(row['name']) or 'user'}"
+                archive.writestr(f'{stem}.txt', config)
+                if with_qr:
+                    archive.writestr(f'{stem}.png', make_qr_png(row['link']).getvalue(),
+                                     compress_type=zipfile.ZIP_STORED)
+                yield sink.drain()
+        yield sink.drain()
+
+    return _download(generate(), 'application/zip', f'{kind}-accounts-{_stamp()}.zip')
@@ -0,0 +1,49 @@
+from flask import Blueprint, render_template, request, redirect, url_for, flash
+from flask_login import login_user, logout_user, login_required, current_user
+from models import Admin
+from stats import get_dashboard_stats
+from helpers import get_system_info, get_active_connections
+
+bp = Blueprint('main', __name__)
+
+@bp.route('/')
+@login_required
+def index():
+    """Dashboard"""
+    stats = get_dashboard_stats()
+    active_connections = get_active_connections()
+    system_info = get_system_info()
+    
+    return render_template('index.html',
+                         stats=stats,
+                         total_users=stats['ssh']['total'],
+                         active_users=stats['ssh']['active'],
+                         expired_users=stats['ssh']['expired'],
+                         active_connections=active_connections,
+                         system=system_info)
+
+@bp.route('/login', methods=['GET', 'POST'])
+def login():
+    """Admin login"""
+    if current_user.is_authenticated:
+        return redirect(url_for('main.index'))
+    
+    if request.method == 'POST':
+        username = request.form.get('username')
+        password = request.form.get('password')
+        
+        admin = Admin.query.filter_by(username=username).first()
+        if admin and admin.check_password(password):
+            login_user(admin)
+            return redirect(url_for('main.index'))
+        else:
+            flash('Invalid username or password', 'error')
+    
+    return render_template('login.html')
+
+@bp.route('/logout')
+@login_required
+def logout():
+    """Logout"""
+    logout_user()
+    return redirect(url_for('main.login'))
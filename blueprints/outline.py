@@ -0,0 +1,184 @@
+from flask import Blueprint, render_template, request, redirect, url_for, flash, jsonify, send_file
+from flask_login import login_required
+from models import db, OutlineUser, ServerConfig
+from helpers import script_path, make_qr_png, get_setting, account_name_error
+from ports import allocate_ports, release_port, get_port_range, PortRangeExhausted
+from bulk import bulk_form_response
+from shaping import sync_shaping
+import base64
+import secrets
+import sysexec
+import urllib.parse
+
+bp = Blueprint('outline', __name__)
+
+def sync_outline_units(lines, description):
+    """Feed start/stop lines to outline_batch.sh in the background"""
+    sysexec.spawn([script_path('outline_batch.sh')], timeout=120, key='outline',
+                  input='\n'.join(lines) + '\n', description=description)
+
+def create_outline_account(name, data_limit, rate_limit_mbps=0):
+    """Insert an Outline user and start its server; raises ValueError or PortRangeExhausted"""
+    error = account_name_error(name)
+    if error:
+        raise ValueError(error)
+
+    # Generate random password and port
+    password = secrets.token_urlsafe(16)
+    try:
+        port = allocate_ports(1)[0]
+    except PortRangeExhausted:
+        db.session.rollback()
+        raise
+    method = 'chacha20-ietf-poly1305'
+
+    # Get server address
+    server_address = get_setting('outline_address', '167.172.67.17')
+
+    # Generate Shadowsocks access key with name
+    credentials = f"{method}:{password}"
+    encoded = base64.urlsafe_b64encode(credentials.encode()).decode().rstrip('=')
+    name_encoded = urllib.parse.quote(name)
+    access_key = f"ss://{encoded}@{server_address}:{port}#{name_encoded}"
+
+    # Create user
+    user = OutlineUser(
+        name=name,
+        access_key=access_key,
+        password=password,
+        port=port,
+        method=method,
+        data_limit_gb=data_limit,
+        rate_limit_mbps=rate_limit_mbps
+    )
+    db.session.add(user)
+    db.session.commit()
+    if rate_limit_mbps:
+        sync_shaping()
+
+    # Auto-start Shadowsocks server in the background; failures are logged
+    sysexec.spawn([script_path('start_outline_server.sh'), name, user.password, str(user.port)],
+                  timeout=15, key='outline', description=f'Start Outline server for {name}')
+    return user
+
+@bp.route('/outline', methods=['GET', 'POST'])
+@login_required
+def outline_users():
+    """Outline users page (create + list in one page)"""
+    if request.method == 'POST':
+        name = request.form.get('name')
+        data_limit = float(request.form.get('data_limit', 0))
+        rate_limit = int(request.form.get('rate_limit_mbps', 0) or 0)
+
+        try:
+            create_outline_account(name, data_limit, max(rate_limit, 0))
+        except (ValueError, PortRangeExhausted) as e:
+            flash(str(e), 'error')
+            return redirect(url_for('outline.outline_users'))
+        flash(f'Outline user {name} created, server is starting!', 'success')
+        return redirect(url_for('outline.outline_users'))
+
+    # Get all users
+    users = OutlineUser.query.order_by(OutlineUser.created_at.desc()).all()
+
+    # Get server address for display
+    server_address = get_setting('outline_address', '167.172.67.17')
+
+    return render_template('outline_users.html', users=users, server_address=server_address)
+
+@bp.route('/outline/<int:user_id>/delete', methods=['POST'])
+@login_required
+def outline_delete(user_id):
+    """Delete Outline user"""
+    user = OutlineUser.query.get_or_404(user_id)
+    name = user.name
+    release_port(user.port)
+    db.session.delete(user)
+    db.session.commit()
+
+    # Remove the shadowsocks-<name> unit as well
+    sync_outline_units([f'stop {name}'], f'Stop Outline server for {name}')
+    if user.rate_limit_mbps:
+        sync_shaping()
+
+    flash(f'Outline user {name} deleted successfully!', 'success')
+    return redirect(url_for('outline.outline_users'))
+
+@bp.route('/outline/<int:user_id>/toggle', methods=['POST'])
+@login_required
+def outline_toggle(user_id):
+    """Toggle Outline user active status"""
+    user = OutlineUser.query.get_or_404(user_id)
+    user.is_active = not user.is_active
+    db.session.commit()
+
+    if user.is_active:
+        sync_outline_units([f'start {user.port} {user.password} {user.name}'], f'Start Outline server for {user.name}')
+    else:
+        sync_outline_units([f'stop {user.name}'], f'Stop Outline server for {user.name}')
+    if user.rate_limit_mbps:
+        sync_shaping()
+
+    status = 'enabled' if user.is_active else 'disabled'
+    flash(f'Outline user {user.name} {status}!', 'success')
+    return redirect(url_for('outline.outline_users'))
+
+@bp.route('/outline/<int:user_id>/key')
+@login_required
+def outline_key(user_id):
+    """Get Outline access key"""
+    user = OutlineUser.query.get_or_404(user_id)
+    return jsonify({'key': user.access_key})
+
+@bp.route('/outline/<int:user_id>/qr')
+@login_required
+def outline_qr(user_id):
+    """Generate QR code for Outline access key"""
+    user = OutlineUser.query.get_or_404(user_id)
+
+    return send_file(make_qr_png(user.access_key), mimetype='image/png', as_attachment=False,
+                     download_name=f'{user.name}_outline_qr.png')
+
+@bp.route('/outline/bulk', methods=['POST'])
+@login_required
+def outline_bulk():
+    """Enable, disable, delete or reset usage of many Outline users at once"""
+    return bulk_form_response('outline', 'outline.outline_users')
+
+@bp.route('/outline/settings', methods=['GET', 'POST'])
+@login_required
+def outline_settings():
+    """Outline server settings"""
+    if request.method == 'POST':
+        address = request.form.get('address')
+        port_min = int(request.form.get('port_min', 0) or 0)
+        port_max = int(request.form.get('port_max', 0) or 0)
+
+        if port_min and port_max and not (1024 <= port_min <= port_max <= 65535):
+            flash('Port range must be within 1024-65535 and start below its end', 'error')
+            return redirect(url_for('outline.outline_settings'))
+
+        # Update address and port range
+        configs = {'outline_address': address}
+        if port_min and port_max:
+            configs['outline_port_min'] = str(port_min)
+            configs['outline_port_max'] = str(port_max)
+
+        for key, value in configs.items():
+            config = ServerConfig.query.filter_by(key=key).first()
+            if config:
+                config.value = value
+            else:
+                config = ServerConfig(key=key, value=value)
+                db.session.add(config)
+
+        db.session.commit()
+        flash('Outline settings updated successfully!', 'success')
+        return redirect(url_for('outline.outline_settings'))
+
+    # Get current settings
+    current_address = get_setting('outline_address', '167.172.67.17')
+    port_min, port_max = get_port_range()
+
+    return render_template('outline_settings.html', address=current_address,
+                           port_min=port_min, port_max=port_max)
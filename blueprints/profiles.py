@@ -0,0 +1,49 @@
+from flask import Blueprint, Response, render_template, request, redirect, url_for, flash
+from flask_login import login_required
+from models import db, RequestProfile
+from profiler import start_profile, finish_profile, abort_profile, hot_frames
+
+bp = Blueprint('profiles', __name__)
+
+# Profiling hooks run for every blueprint; they return at once unless an admin
+# asked for a profile (see profiler.py)
+bp.before_app_request(start_profile)
+bp.after_app_request(finish_profile)
+bp.teardown_app_request(abort_profile)
+
+@bp.route('/profiles')
+@login_required
+def profile_list():
+    """Recent request profiles, optionally for one route"""
+    route = request.args.get('route', '')
+    query = db.select(RequestProfile).order_by(RequestProfile.id.desc()).limit(200)
+    if route:
+        query = query.where(RequestProfile.route == route)
+    profiles = db.session.scalars(query.options(db.defer(RequestProfile.stacks))).all()
+    routes = db.session.scalars(db.select(RequestProfile.route).distinct().order_by(RequestProfile.route)).all()
+    return render_template('profiles.html', profiles=profiles, routes=routes, route=route)
+
+@bp.route('/profiles/<int:profile_id>')
+@login_required
+def profile_detail(profile_id):
+    """Hottest functions of one profile"""
+    profile = RequestProfile.query.get_or_404(profile_id)
+    own, inclusive = hot_frames(profile.stacks or '')
+    return render_template('profile_detail.html', profile=profile, own=own, inclusive=inclusive)
+
+@bp.route('/profiles/<int:profile_id>.folded')
+@login_required
+def profile_download(profile_id):
+    """Collapsed stacks for flamegraph.pl or speedscope"""
+    profile = RequestProfile.query.get_or_404(profile_id)
+    return Response(profile.stacks or '', mimetype='text/plain', headers={
+        'Content-Disposition': f'attachment; filename=profile-{profile.id}-{profile.endpoint or "request"}.folded'})
+
+@bp.route('/profiles/clear', methods=['POST'])
+@login_required
+def profile_clear():
+    """Delete all stored profiles"""
+    db.session.execute(db.delete(RequestProfile))
+    db.session.commit()
+    flash('Request profiles deleted', 'success')
+    return redirect(url_for('profiles.profile_list'))
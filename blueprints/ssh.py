@@ -0,0 +1,243 @@
+from flask import Blueprint, current_app, render_template, request, redirect, url_for, flash, jsonify, send_file
+from flask_login import login_required
+from models import db, SSHUser, Connection, ServerConfig
+from helpers import run_command, script_path, make_qr_png, get_system_info, get_user_connection_stats, ssh_credentials_error
+from links import ssh_config_text, ssh_link
+from bulk import bulk_form_response, run_bulk, BulkError
+from shaping import sync_shaping
+from datetime import datetime, timedelta
+import re
+import sysexec
+
+SSH_BANNER_FILE = '/etc/ssh/banner.txt'
+SSHD_CONFIG = '/etc/ssh/sshd_config'
+
+bp = Blueprint('ssh', __name__)
+
+@bp.route('/users')
+@login_required
+def users():
+    """List all SSH users with connection stats"""
+    all_users = SSHUser.query.order_by(SSHUser.created_at.desc()).all()
+    user_stats = get_user_connection_stats()
+
+    # Attach connection stats to user objects for template
+    for user in all_users:
+        stats = user_stats.get(user.username, {'status': 'offline', 'device_count': 0})
+        user.is_online = (stats['status'] == 'online')
+        user.device_count = stats['device_count']
+
+    return render_template('users.html', users=all_users, user_stats=user_stats)
+
+@bp.route('/settings/banner', methods=['GET', 'POST'])
+@login_required
+def banner():
+    """Manage SSH Banner"""
+    banner_config = ServerConfig.query.filter_by(key='ssh_banner').first()
+
+    if request.method == 'POST':
+        banner_text = request.form.get('banner_text')
+        if banner_config:
+            banner_config.value = banner_text
+        else:
+            banner_config = ServerConfig(key='ssh_banner', value=banner_text)
+            db.session.add(banner_config)
+
+        db.session.commit()
+
+        # Apply banner to system
+        try:
+            with open(SSH_BANNER_FILE, 'w') as f:
+                f.write(banner_text)
+
+            with open(SSHD_CONFIG) as f:
+                sshd_config = f.read()
+            sshd_config = re.sub(r'^#Banner none', f'Banner {SSH_BANNER_FILE}', sshd_config, flags=re.M)
+            sshd_config = re.sub(r'^Banner.*', f'Banner {SSH_BANNER_FILE}', sshd_config, flags=re.M)
+            with open(SSHD_CONFIG, 'w') as f:
+                f.write(sshd_config)
+        except OSError as e:
+            flash(f'Banner saved but could not be applied: {e}', 'error')
+            return redirect(url_for('ssh.banner'))
+
+        # Restart in the background, the request does not wait for sshd
+        sysexec.spawn(['systemctl', 'restart', 'ssh'], key='sshd', coalesce=True,
+                      description='Restart sshd for new banner')
+
+        flash('SSH Banner updated successfully!', 'success')
+        return redirect(url_for('ssh.banner'))
+
+    current_banner = banner_config.value if banner_config else ''
+    return render_template('banner.html', current_banner=current_banner)
+
+def create_ssh_account(username, password, days, max_connections=2, notes='', rate_limit_mbps=0):
+    """Create the system account, then the panel record; returns (user, error)"""
+    error = ssh_credentials_error(username, password)
+    if error:
+        return None, error
+
+    # Check if user already exists
+    if SSHUser.query.filter_by(username=username).first():
+        return None, f'User {username} already exists!'
+    # System accounts the panel does not own (root, the operator's login, ...)
+    if run_command(['id', '-u', username])[0]:
+        return None, f'An account named {username} already exists on this server!'
+
+    # Create system user
+    cmd = [script_path('create_ssh_user.sh'), username, password, str(days)]
+    current_app.logger.info(f'Executing: {cmd[0]} {username}')
+    success, stdout, stderr = run_command(cmd)
+    current_app.logger.info(f'Result: success={success}, stdout={stdout}, stderr={stderr}')
+
+    if not success:
+        current_app.logger.error(f'Script failed: {stderr}')
+        return None, f'Failed to create system user: {stderr}'
+
+    # Verify system user was actually created
+    verify_success, verify_out, _ = run_command(['id', username])
+    if not verify_success:
+        current_app.logger.error(f'System user {username} not found after creation!')
+        return None, 'System user creation reported success but user not found!'
+
+    current_app.logger.info(f'System user verified: {verify_out}')
+
+    # Add to database
+    expiry_date = datetime.utcnow() + timedelta(days=days)
+    new_user = SSHUser(
+        username=username,
+        password=password,
+        expiry_date=expiry_date,
+        max_connections=max_connections,
+        notes=notes,
+        rate_limit_mbps=rate_limit_mbps
+    )
+    db.session.add(new_user)
+    db.session.commit()
+
+    if rate_limit_mbps:
+        sync_shaping()
+    return new_user, None
+
+@bp.route('/users/create', methods=['GET', 'POST'])
+@login_required
+def create_user():
+    """Create new SSH user"""
+    if request.method == 'POST':
+        username = request.form.get('username')
+        password = request.form.get('password')
+        days = int(request.form.get('days', 30))
+        max_conn = int(request.form.get('max_connections', 2))
+        notes = request.form.get('notes', '')
+        rate_limit = int(request.form.get('rate_limit_mbps', 0) or 0)
+
+        _, error = create_ssh_account(username, password, days, max_conn, notes, max(rate_limit, 0))
+        if error:
+            flash(error, 'error')
+            return redirect(url_for('ssh.create_user'))
+
+        flash(f'User {username} created successfully!', 'success')
+        return redirect(url_for('ssh.users'))
+
+    return render_template('create_user.html')
+
+@bp.route('/users/<int:user_id>/delete', methods=['POST'])
+@login_required
+def delete_user(user_id):
+    """Delete SSH user"""
+    user = SSHUser.query.get_or_404(user_id)
+
+    # Delete system user; keep the panel record if that fails so the two stay in sync
+    success, _, stderr = run_command([script_path('delete_ssh_user.sh'), user.username])
+    if not success:
+        current_app.logger.error(f'Failed to delete system user {user.username}: {stderr}')
+        flash(f'Failed to delete system user {user.username}: {stderr}', 'error')
+        return redirect(url_for('ssh.users'))
+
+    # Delete from database
+    db.session.delete(user)
+    db.session.commit()
+    if user.rate_limit_mbps:
+        sync_shaping()
+
+    flash(f'User {user.username} deleted successfully!', 'success')
+    return redirect(url_for('ssh.users'))
+
+@bp.route('/users/<int:user_id>/extend', methods=['POST'])
+@login_required
+def extend_user(user_id):
+    """Extend user expiry date (database and system account, like the bulk action)"""
+    user = SSHUser.query.get_or_404(user_id)
+    days = int(request.form.get('days', 30))
+
+    try:
+        result = run_bulk('ssh', 'extend', ids=[user.id], days=days)[0]
+    except BulkError as e:
+        flash(str(e), 'error')
+        return redirect(url_for('ssh.users'))
+
+    if result['ok']:
+        flash(f'User {user.username} extended by {days} days!', 'success')
+    else:
+        flash(f"User {user.username}: {result['detail']}", 'error')
+    return redirect(url_for('ssh.users'))
+
+@bp.route('/users/bulk', methods=['POST'])
+@login_required
+def bulk_users():
+    """Extend, enable, disable or delete many SSH users at once"""
+    return bulk_form_response('ssh', 'ssh.users')
+
+@bp.route('/monitor')
+@login_required
+def monitor():
+    """Real-time connection monitoring"""
+    connections = Connection.query.all()
+    return render_template('monitor.html', connections=connections)
+
+@bp.route('/api/system-stats')
+@login_required
+def api_system_stats():
+    """API endpoint for real-time system stats"""
+    return jsonify(get_system_info())
+
+@bp.route('/api/connections')
+@login_required
+def api_connections():
+    """API endpoint for active connections"""
+    # Parse 'who' command output
+    success, output, _ = run_command(['who'])
+    connections = []
+
+    if success and output:
+        for line in output.strip().split('\n'):
+            if line and 'tty' not in line:
+                parts = line.split()
+                if len(parts) >= 5:
+                    connections.append({
+                        'username': parts[0],
+                        'ip': parts[4].strip('()'),
+                        'time': ' '.join(parts[2:4])
+                    })
+
+    return jsonify(connections)
+
+@bp.route('/config/<string:username>')
+@login_required
+def generate_config(username):
+    """Generate SSH config file"""
+    user = SSHUser.query.filter_by(username=username).first_or_404()
+    server_ip = request.host.split(':')[0]
+
+    config_text = ssh_config_text(user, server_ip)
+
+    return config_text, 200, {'Content-Type': 'text/plain; charset=utf-8',
+                               'Content-Disposition': f'attachment; filename={username}_config.txt'}
+
+@bp.route('/qr/<string:username>')
+@login_required
+def generate_qr(username):
+    """Generate QR code for SSH config"""
+    user = SSHUser.query.filter_by(username=username).first_or_404()
+    server_ip = request.host.split(':')[0]
+
+    return send_file(make_qr_png(ssh_link(user, server_ip)), mimetype='image/png')
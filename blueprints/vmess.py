@@ -0,0 +1,186 @@
+from flask import Blueprint, render_template, request, redirect, url_for, flash, jsonify, send_file
+from flask_login import login_required
+from models import db, VMessUser, ServerConfig
+from helpers import script_path, make_qr_png, get_setting, account_name_error
+from links import vmess_user_link
+from bulk import bulk_form_response
+from datetime import datetime, timedelta
+import sysexec
+import uuid as uuid_lib
+
+bp = Blueprint('vmess', __name__)
+
+def get_vmess_settings():
+    """Current VMess connection settings from ServerConfig"""
+    return {
+        'address': get_setting('vmess_address', 'ssh.thunnwathanlin.codes'),
+        'host': get_setting('vmess_host', ''),
+        'port': get_setting('vmess_port', '443'),
+        'tls': get_setting('vmess_tls', 'tls'),
+    }
+
+def sync_xray(action, uuid):
+    """Regenerate the Xray config in the background (manage_vmess.sh restarts xray)"""
+    # Every action rebuilds the whole config from the database, so a burst of
+    # changes is merged into one queued run
+    sysexec.spawn([script_path('manage_vmess.sh'), 'sync'], key='xray', coalesce=True,
+                  description=f'manage_vmess.sh sync ({action} {uuid})')
+
+@bp.route('/vmess')
+@login_required
+def vmess_list():
+    """List VMess users"""
+    users = VMessUser.query.all()
+    return render_template('vmess_list.html', users=users)
+
+def create_vmess_account(name, data_limit, expiry_days, rate_limit_mbps=0):
+    """Insert a VMess user and add it to Xray; raises ValueError for an invalid name"""
+    error = account_name_error(name)
+    if error:
+        raise ValueError(error)
+
+    # Generate UUID
+    new_uuid = str(uuid_lib.uuid4())
+    expiry_date = datetime.utcnow() + timedelta(days=expiry_days)
+
+    # Create database record
+    user = VMessUser(
+        name=name,
+        uuid=new_uuid,
+        data_limit_gb=data_limit,
+        expiry_date=expiry_date,
+        rate_limit_mbps=rate_limit_mbps
+    )
+    db.session.add(user)
+    db.session.commit()
+
+    # Add to Xray config
+    sync_xray('add', new_uuid)
+    return user
+
+@bp.route('/vmess/create', methods=['GET', 'POST'])
+@login_required
+def vmess_create():
+    """Create new VMess user"""
+    if request.method == 'POST':
+        name = request.form.get('name')
+        data_limit = int(request.form.get('data_limit', 0))
+        expiry_days = int(request.form.get('expiry_days', 30))
+        rate_limit = int(request.form.get('rate_limit_mbps', 0) or 0)
+
+        try:
+            create_vmess_account(name, data_limit, expiry_days, max(rate_limit, 0))
+
+            flash(f'VMess user "{name}" created successfully!', 'success')
+            return redirect(url_for('vmess.vmess_list'))
+        except Exception as e:
+            db.session.rollback()
+            flash(f'Error creating user: {str(e)}', 'danger')
+
+    return render_template('vmess_create.html')
+
+@bp.route('/vmess/<int:user_id>/delete', methods=['POST'])
+@login_required
+def vmess_delete(user_id):
+    """Delete VMess user"""
+    user = VMessUser.query.get_or_404(user_id)
+    uuid = user.uuid
+    name = user.name
+
+    try:
+        # Delete from database
+        db.session.delete(user)
+        db.session.commit()
+
+        # Remove from Xray config (regenerated from the database)
+        sync_xray('remove', uuid)
+
+        flash(f'VMess user "{name}" deleted successfully!', 'success')
+    except Exception as e:
+        db.session.rollback()
+        flash(f'Error deleting user: {str(e)}', 'danger')
+
+    return redirect(url_for('vmess.vmess_list'))
+
+@bp.route('/vmess/<int:user_id>/link')
+@login_required
+def vmess_link(user_id):
+    """Get VMess link"""
+    user = VMessUser.query.get_or_404(user_id)
+
+    return jsonify({'link': vmess_user_link(user, get_vmess_settings())})
+
+@bp.route('/vmess/<int:user_id>/qr')
+@login_required
+def vmess_qr(user_id):
+    """Generate QR code for VMess link"""
+    user = VMessUser.query.get_or_404(user_id)
+
+    return send_file(make_qr_png(vmess_user_link(user, get_vmess_settings())), mimetype='image/png')
+
+@bp.route('/vmess/<int:user_id>/toggle', methods=['POST'])
+@login_required
+def vmess_toggle(user_id):
+    """Toggle VMess user active status"""
+    user = VMessUser.query.get_or_404(user_id)
+    user.is_active = not user.is_active
+
+    try:
+        db.session.commit()
+
+        if user.is_active:
+            sync_xray('add', user.uuid)
+        else:
+            sync_xray('remove', user.uuid)
+
+        flash(f'User "{user.name}" {"enabled" if user.is_active else "disabled"}!', 'success')
+    except Exception as e:
+        db.session.rollback()
+        flash(f'Error: {str(e)}', 'danger')
+
+    return redirect(url_for('vmess.vmess_list'))
+
+@bp.route('/vmess/bulk', methods=['POST'])
+@login_required
+def vmess_bulk():
+    """Extend, enable, disable, delete or reset usage of many VMess users at once"""
+    return bulk_form_response('vmess', 'vmess.vmess_list')
+
+@bp.route('/vmess/settings', methods=['GET', 'POST'])
+@login_required
+def vmess_settings():
+    """VMess settings configuration"""
+    if request.method == 'POST':
+        address = request.form.get('address')
+        host = request.form.get('host')
+        port = request.form.get('port')
+        tls = request.form.get('tls')
+
+        # Update configs
+        configs = {
+            'vmess_address': address,
+            'vmess_host': host,
+            'vmess_port': port,
+            'vmess_tls': tls
+        }
+
+        for key, value in configs.items():
+            config = ServerConfig.query.filter_by(key=key).first()
+            if config:
+                config.value = value
+            else:
+                config = ServerConfig(key=key, value=value)
+                db.session.add(config)
+
+        db.session.commit()
+        flash('VMess settings updated successfully!', 'success')
+        return redirect(url_for('vmess.vmess_settings'))
+
+    # Get current settings
+    settings = get_vmess_settings()
+
+    return render_template('vmess_settings.html',
+                         address=settings['address'],
+                         host=settings['host'],
+                         port=settings['port'],
+                         tls=settings['tls'])
@@ -0,0 +1,246 @@
+from flask import flash, redirect, render_template, request, url_for
+from models import db, SSHUser, VMessUser, OutlineUser
+from helpers import run_command, script_path
+from ports import release_ports
+from shaping import apply_shaping, sync_shaping
+from datetime import datetime
+
+# Bulk account operations. A selection of ids or a status filter picks the
+# rows, one set-based UPDATE/DELETE changes them in a single transaction, and
+# every affected subsystem gets exactly one sync (ssh_batch.sh,
+# manage_vmess.sh sync, outline_batch.sh, apply_shaping.sh). Results are
+# reported per row.
+
+BULK_ACTIONS = {
+    'ssh': ['extend', 'enable', 'disable', 'delete', 'limit'],
+    'vmess': ['extend', 'enable', 'disable', 'delete', 'reset', 'limit'],
+    'outline': ['enable', 'disable', 'delete', 'reset', 'limit'],
+}
+
+# Keeps every IN (...) below the bound parameter limit of older SQLite builds
+CHUNK_SIZE = 900
+
+
+class BulkError(Exception):
+    """Bulk request that cannot be applied (unknown action, no selection)"""
+
+
+def _chunks(ids):
+    for start in range(0, len(ids), CHUNK_SIZE):
+        yield ids[start:start + CHUNK_SIZE]
+
+
+def _target_columns(kind):
+    if kind == 'ssh':
+        return SSHUser, [SSHUser.id, SSHUser.username.label('name'), SSHUser.rate_limit_mbps]
+    if kind == 'vmess':
+        return VMessUser, [VMessUser.id, VMessUser.name, VMessUser.rate_limit_mbps]
+    return OutlineUser, [OutlineUser.id, OutlineUser.name, OutlineUser.port, OutlineUser.password,
+                         OutlineUser.rate_limit_mbps]
+
+
+def select_targets(kind, ids=None, status=None):
+    """Rows picked by a get_status() value ('all' for every row), else by id"""
+    model, columns = _target_columns(kind)
+    query = db.select(*columns).order_by(model.id)
+    if status:
+        if status != 'all':
+            query = query.where(model.status_expression(datetime.utcnow()) == status)
+        return db.session.execute(query).all()
+
+    targets = []
+    for chunk in _chunks(sorted(set(ids or []))):
+        targets.extend(db.session.execute(query.where(model.id.in_(chunk))).all())
+    return targets
+
+
+def _update(model, ids, values):
+    for chunk in _chunks(ids):
+        db.session.execute(db.update(model).where(model.id.in_(chunk)).values(values)
+                           .execution_options(synchronize_session=False))
+
+
+def _delete(model, ids):
+    for chunk in _chunks(ids):
+        db.session.execute(db.delete(model).where(model.id.in_(chunk))
+                           .execution_options(synchronize_session=False))
+
+
+def _extended(column, days):
+    # Done by SQLite itself so the UPDATE stays set-based
+    return db.func.datetime(column, f'+{days} days')
+
+
+def _run_batch(script, lines):
+    """One batch script call; ({(action, name): ok}, error text) from its OK/FAILED lines"""
+    _, output, error = run_command([script_path(script)], timeout=600, input='\n'.join(lines) + '\n')
+    outcome = {}
+    for line in output.splitlines():
+        fields = line.split(None, 2)
+        if len(fields) == 3 and fields[0] in ('OK', 'FAILED'):
+            outcome[(fields[1], fields[2])] = fields[0] == 'OK'
+    return outcome, error.strip()
+
+
+def _result(target, ok, detail):
+    return {'id': target.id, 'name': target.name, 'ok': ok, 'detail': detail}
+
+
+def _bulk_ssh(action, targets, days):
+    ids = [target.id for target in targets]
+
+    if action == 'delete':
+        # System accounts go first; panel rows are only removed where that worked
+        outcome, error = _run_batch('ssh_batch.sh', [f'delete {t.name}' for t in targets])
+        _delete(SSHUser, [t.id for t in targets if outcome.get(('delete', t.name))])
+        db.session.commit()
+        return [_result(t, True, 'Deleted') if outcome.get(('delete', t.name))
+                else _result(t, False, f'System account not removed, kept in panel {error}'.strip())
+                for t in targets]
+
+    if action == 'extend':
+        _update(SSHUser, ids, {'expiry_date': _extended(SSHUser.expiry_date, days)})
+        db.session.commit()
+        expiry = {}
+        for chunk in _chunks(ids):
+            expiry.update(db.session.execute(
+                db.select(SSHUser.id, SSHUser.expiry_date).where(SSHUser.id.in_(chunk))).all())
+        host_action = 'expire'
+        lines = [f'expire {t.name} {expiry[t.id].date().isoformat()}' for t in targets]
+        done = {t.id: f'Extended to {expiry[t.id]:%Y-%m-%d}' for t in targets}
+    else:
+        _update(SSHUser, ids, {'is_active': action == 'enable'})
+        db.session.commit()
+        host_action = 'unlock' if action == 'enable' else 'lock'
+        lines = [f'{host_action} {t.name}' for t in targets]
+        done = {t.id: 'Enabled' if action == 'enable' else 'Disabled' for t in targets}
+
+    outcome, error = _run_batch('ssh_batch.sh', lines)
+    return [_result(t, True, done[t.id]) if outcome.get((host_action, t.name))
+            else _result(t, False, f'{done[t.id]} in panel, system account not updated {error}'.strip())
+            for t in targets]
+
+
+def _bulk_vmess(action, targets, days):
+    ids = [target.id for target in targets]
+
+    if action == 'extend':
+        _update(VMessUser, ids, {'expiry_date': _extended(VMessUser.expiry_date, days)})
+    elif action == 'reset':
+        _update(VMessUser, ids, {'used_data_gb': 0})
+    elif action == 'delete':
+        _delete(VMessUser, ids)
+    else:
+        _update(VMessUser, ids, {'is_active': action == 'enable'})
+    db.session.commit()
+
+    done = {'extend': f'Extended by {days} days', 'reset': 'Usage reset', 'delete': 'Deleted',
+            'enable': 'Enabled', 'disable': 'Disabled'}[action]
+    if action in ('extend', 'reset'):
+        # Expiry and usage are not part of the Xray config
+        return [_result(t, True, done) for t in targets]
+
+    # One config regeneration (and Xray restart) for the whole selection
+    success, _, error = run_command([script_path('manage_vmess.sh'), 'sync'], timeout=60)
+    if success:
+        return [_result(t, True, done) for t in targets]
+    return [_result(t, False, f'{done} in panel, Xray sync failed {error.strip()}'.strip()) for t in targets]
+
+
+def _bulk_outline(action, targets, days):
+    ids = [target.id for target in targets]
+
+    if action == 'reset':
+        _update(OutlineUser, ids, {'used_data_gb': 0})
+        db.session.commit()
+        return [_result(t, True, 'Usage reset') for t in targets]
+
+    if action == 'delete':
+        release_ports([t.port for t in targets])
+        _delete(OutlineUser, ids)
+    else:
+        _update(OutlineUser, ids, {'is_active': action == 'enable'})
+    db.session.commit()
+
+    if action == 'enable':
+        host_action = 'start'
+        lines = [f'start {t.port} {t.password} {t.name}' for t in targets]
+    else:
+        host_action = 'stop'
+        lines = [f'stop {t.name}' for t in targets]
+    done = {'enable': 'Enabled', 'disable': 'Disabled', 'delete': 'Deleted'}[action]
+
+    outcome, error = _run_batch('outline_batch.sh', lines)
+    return [_result(t, True, done) if outcome.get((host_action, t.name))
+            else _result(t, False, f'{done} in panel, server unit not updated {error}'.strip())
+            for t in targets]
+
+
+def _bulk_limit(kind, targets, mbps):
+    model, _ = _target_columns(kind)
+    _update(model, [t.id for t in targets], {'rate_limit_mbps': mbps})
+    db.session.commit()
+
+    done = f'Limited to {mbps} Mbit/s' if mbps else 'Limit removed'
+    if kind == 'vmess':
+        return [_result(t, True, f'{done} (stored only, not enforced for VMess)') for t in targets]
+
+    # The whole shaping state is re-applied once for the selection
+    success, output = apply_shaping()
+    if success:
+        return [_result(t, True, done) for t in targets]
+    return [_result(t, False, f'{done} in panel, shaping not applied {output.strip()}'.strip()) for t in targets]
+
+
+_HANDLERS = {
+    'ssh': _bulk_ssh,
+    'vmess': _bulk_vmess,
+    'outline': _bulk_outline,
+}
+
+
+def run_bulk(kind, action, ids=None, status=None, days=0, mbps=0):
+    """Apply one action to many accounts; returns [{'id', 'name', 'ok', 'detail'}]"""
+    if action not in BULK_ACTIONS.get(kind, []):
+        raise BulkError(f'Unknown bulk action "{action}" for {kind} users')
+    if action == 'extend' and days < 1:
+        raise BulkError('Extend needs a positive number of days')
+    if action == 'limit' and mbps < 0:
+        raise BulkError('Limit must be 0 (unlimited) or more Mbit/s')
+    if not ids and not status:
+        raise BulkError('Select some users or a status to apply the action to')
+
+    targets = select_targets(kind, ids, status)
+    if not targets:
+        return []
+    if action == 'limit':
+        return _bulk_limit(kind, targets, mbps)
+
+    results = _HANDLERS[kind](action, targets, days)
+    if kind != 'vmess' and action in ('enable', 'disable', 'delete') and any(t.rate_limit_mbps for t in targets):
+        # Shaped users came or went
+        sync_shaping()
+    return results
+
+
+def bulk_form_response(kind, list_endpoint):
+    """POST handler shared by the bulk routes of the account blueprints"""
+    ids = [int(i) for i in request.form.getlist('ids') if i.isdigit()]
+    action = request.form.get('operation', '')
+    status = request.form.get('status', '')
+    days = int(request.form.get('days', 0) or 0)
+    mbps = int(request.form.get('mbps', 0) or 0)
+
+    try:
+        results = run_bulk(kind, action, ids=ids, status=status, days=days, mbps=mbps)
+    except BulkError as e:
+        flash(str(e), 'error')
+        return redirect(url_for(list_endpoint))
+
+    if not results:
+        flash('No users matched the selection', 'error')
+        return redirect(url_for(list_endpoint))
+
+    failed = sum(1 for result in results if not result['ok'])
+    return render_template('bulk_results.html', kind=kind, action=action, results=results,
+                           failed=failed, list_endpoint=list_endpoint)
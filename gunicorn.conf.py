@@ -0,0 +1,22 @@
+# Gunicorn settings for the panel service (see install.sh)
+#
+#   gunicorn -c gunicorn.conf.py "app:create_app()"
+
+bind = '127.0.0.1:5000'
+workers = 3
+
+# Import and build the app once in the master; workers are forked from it, so
+# respawning a worker does not re-import Flask, SQLAlchemy and the blueprints.
+preload_app = True
+
+def when_ready(server):
+    """Bring the schema up to date once, before any worker serves a request"""
+    from schema import init_db
+    app = server.app.wsgi()
+    with app.app_context():
+        init_db()
+
+def post_fork(server, worker):
+    """Each worker must open its own SQLite connections"""
+    from app import dispose_db_connections
+    dispose_db_connections(worker.app.wsgi())
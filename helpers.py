@@ -0,0 +1,154 @@
+from flask import current_app
+from models import db, SSHUser, ServerConfig
+from snapshot import shared_snapshot, invalidate_on_write
+import os
+import re
+import sysexec
+
+# Helper functions shared by the blueprints. Heavy modules (psutil, qrcode/PIL)
+# are imported inside the functions that need them so that importing the app,
+# and every gunicorn worker respawn, stays cheap. Stats and settings that every
+# worker would otherwise compute on its own are served from the shared
+# snapshot cache (snapshot.py).
+
+def run_command(args, timeout=30, input=None):
+    """Execute a command (argument list, no shell) and return output"""
+    return sysexec.run(args, timeout=timeout, input=input)
+
+# Account names and passwords end up in command arguments, chpasswd input,
+# systemd unit names and the line-based stdin of the batch scripts, so they
+# must not contain separators or control characters
+USERNAME_RE = re.compile(r'[a-z_][a-z0-9_-]{0,31}')
+ACCOUNT_NAME_RE = re.compile(r'[A-Za-z0-9][A-Za-z0-9_.@-]{0,63}')
+# read(1) in the batch scripts trims spaces at either end of the last field
+PASSWORD_RE = re.compile(r'[^\x00-\x20\x7f:](?:[^\x00-\x1f\x7f:]{0,126}[^\x00-\x20\x7f:])?')
+
+def ssh_credentials_error(username, password):
+    """Why a username/password pair cannot be used for a system account, or None"""
+    if not USERNAME_RE.fullmatch(username or ''):
+        return 'Invalid username: use lowercase letters, digits, _ and -, starting with a letter or _'
+    if not PASSWORD_RE.fullmatch(password or ''):
+        return 'Invalid password: 1-128 characters, no ":", control characters or spaces at either end'
+    return None
+
+def account_name_error(name):
+    """Why a VMess/Outline account name cannot be used, or None"""
+    if not ACCOUNT_NAME_RE.fullmatch(name or ''):
+        return 'Invalid name: use letters, digits, _ . @ and -, starting with a letter or digit (max 64)'
+    return None
+
+def script_path(name):
+    """Absolute path of a management script"""
+    return os.path.join(current_app.config['SCRIPTS_DIR'], name)
+
+@shared_snapshot('settings', interval=60)
+def load_settings():
+    """All ServerConfig values as a dict"""
+    return dict(db.session.execute(db.select(ServerConfig.key, ServerConfig.value)).all())
+
+# Saved settings take effect at once, not after the next refresh
+invalidate_on_write(ServerConfig, 'settings')
+
+def get_setting(key, default=''):
+    """Read a ServerConfig value"""
+    return load_settings().get(key, default)
+
+def make_qr_png(data):
+    """Render data as a QR code PNG in a BytesIO buffer"""
+    import qrcode
+    from io import BytesIO
+
+    qr = qrcode.QRCode(version=1, box_size=10, border=5)
+    qr.add_data(data)
+    qr.make(fit=True)
+
+    img = qr.make_image(fill_color="black", back_color="white")
+
+    buf = BytesIO()
+    img.save(buf, format='PNG')
+    buf.seek(0)
+    return buf
+
+@shared_snapshot('system', interval=5)
+def get_system_info():
+    """Get server system information"""
+    import psutil
+
+    cpu_percent = psutil.cpu_percent(interval=1)
+    memory = psutil.virtual_memory()
+    disk = psutil.disk_usage('/')
+
+    return {
+        'cpu': cpu_percent,
+        'memory_used': memory.percent,
+        'memory_total': memory.total / (1024**3),  # GB
+        'disk_used': disk.percent,
+        'disk_total': disk.total / (1024**3)  # GB
+    }
+
+@shared_snapshot('active_connections', interval=5)
+def get_active_connections():
+    """Get list of active SSH connections"""
+    success, output, _ = run_command(['who'])
+    if success:
+        return sum(1 for line in output.splitlines() if 'tty' not in line)
+    return 0
+
+@shared_snapshot('connections', interval=5)
+def get_user_connection_stats():
+    """Get detailed active SSH connections by user and device count (PID-based detection)"""
+    user_stats = {}
+
+    # Get all SSH connections
+    success, output, _ = run_command(['ss', '-tnp'])
+
+    # Remote IP of each established sshd connection, keyed by sshd PID
+    pid_ips = {}
+    if success and output:
+        for line in output.splitlines():
+            if ':22' not in line or 'ESTAB' not in line or 'sshd' not in line:
+                continue
+
+            # Extract PID from users:(("sshd",pid=1234,fd=4))
+            pid_match = re.search(r'pid=(\d+)', line)
+            # Extract remote IP from connection line
+            ip_match = re.search(r'([0-9.]+):(\d+)\s+users:', line)
+            if pid_match and ip_match:
+                pid_ips.setdefault(pid_match.group(1), set()).add(ip_match.group(1))
+
+    # Get process info for all PIDs in one call to find usernames
+    if pid_ips:
+        success, output, stderr = run_command(['ps', '-o', 'pid=,args=', '-p', ','.join(pid_ips)], timeout=5)
+        if not success and not output:
+            current_app.logger.error(f"Error checking sshd PIDs: {stderr}")
+        for line in output.splitlines():
+            pid, _, proc_info = line.strip().partition(' ')
+            # Format: "sshd: username [priv]" or "sshd: username@pts/0"
+            user_match = re.search(r'sshd:\s*(\w+)', proc_info)
+            if not user_match or pid not in pid_ips:
+                continue
+            username = user_match.group(1)
+            # Skip root and unknown
+            if username in ['root', 'unknown']:
+                continue
+
+            if username not in user_stats:
+                user_stats[username] = {'status': 'online', 'devices': set()}
+            user_stats[username]['devices'].update(pid_ips[pid])
+
+    # Build final stats for all users
+    all_ssh_users = SSHUser.query.all()
+    final_stats = {}
+    for user in all_ssh_users:
+        username = user.username
+        if username in user_stats:
+            final_stats[username] = {
+                'status': 'online',
+                'device_count': len(user_stats[username]['devices'])
+            }
+        else:
+            final_stats[username] = {
+                'status': 'offline',
+                'device_count': 0
+            }
+    return final_stats
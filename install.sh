@@ -67,7 +67,7 @@ print_header "Installing System Dependencies"
 # Update system
 apt-get update
 apt-get install -y python3 python3-pip python3-venv nginx certbot python3-certbot-nginx sqlite3 shadowsocks-libev \
-    qrencode jq curl wget git shadowsocks-libev sshpass unzip
+    qrencode jq curl wget git shadowsocks-libev sshpass unzip nftables
 
 print_success "System dependencies installed"
 
@@ -88,9 +88,9 @@ PANEL_DIR="/opt/ssh-panel"
 mkdir -p $PANEL_DIR
 
 # Copy application files
-cp $SCRIPT_DIR/app.py $PANEL_DIR/
-cp $SCRIPT_DIR/models.py $PANEL_DIR/
+cp $SCRIPT_DIR/*.py $PANEL_DIR/
 cp $SCRIPT_DIR/requirements.txt $PANEL_DIR/
+cp -r $SCRIPT_DIR/blueprints $PANEL_DIR/
 cp -r $SCRIPT_DIR/templates $PANEL_DIR/
 mkdir -p $PANEL_DIR/static
 
@@ -114,14 +114,17 @@ print_header "Configuring Database"
 
 # Initialize database
 venv/bin/python3 << PYINIT
-from app import app, db
+from app import create_app, db
 from models import Admin, ServerConfig, SSHUser, VMessUser, OutlineUser, Connection
+from schema import init_db
 import secrets
 import string
 
+app = create_app()
+
 with app.app_context():
-    # Create tables
-    db.create_all()
+    # Create tables (and columns added since an older install)
+    init_db()
     
     # Generate admin credentials
     admin_user = 'admin_' + ''.join(secrets.choice(string.ascii_lowercase + string.digits) for _ in range(6))
@@ -323,7 +326,7 @@ User=root
 Group=root
 WorkingDirectory=$PANEL_DIR
 Environment="PATH=/usr/local/sbin:/usr/local/bin:/usr/sbin:/usr/bin:/sbin:/bin"
-ExecStart=$PANEL_DIR/venv/bin/gunicorn --workers 3 --bind 127.0.0.1:5000 app:app
+ExecStart=$PANEL_DIR/venv/bin/gunicorn -c $PANEL_DIR/gunicorn.conf.py "app:create_app()"
 Restart=always
 RestartSec=10
 
@@ -331,9 +334,34 @@ RestartSec=10
 WantedBy=multi-user.target
 SYSTEMDSERVICE
 
+# Nightly online backup of the panel database (see backup.py)
+cat > /etc/systemd/system/ssh-panel-backup.service << BACKUPSERVICE
+[Unit]
+Description=SSH Panel database backup
+
+[Service]
+Type=oneshot
+WorkingDirectory=$PANEL_DIR
+ExecStart=$PANEL_DIR/venv/bin/flask --app app backup create
+BACKUPSERVICE
+
+cat > /etc/systemd/system/ssh-panel-backup.timer << BACKUPTIMER
+[Unit]
+Description=Nightly SSH Panel database backup
+
+[Timer]
+OnCalendar=*-*-* 03:30:00
+RandomizedDelaySec=15m
+Persistent=true
+
+[Install]
+WantedBy=timers.target
+BACKUPTIMER
+
 # Enable and start services
 systemctl daemon-reload
 systemctl enable ssh-panel
+systemctl enable --now ssh-panel-backup.timer
 systemctl enable xray
 systemctl start xray
 systemctl start ssh-panel
@@ -0,0 +1,52 @@
+import base64
+import json
+
+# Client configs and links, built in-process so that listing or exporting many
+# accounts does not start a subprocess per user.
+
+def vmess_link(uuid, address, port, path, host, tls, name):
+    """vmess:// link, same format as scripts/generate_vmess_link.py"""
+    config = {
+        "v": "2",
+        "ps": name,
+        "add": address,
+        "port": port,
+        "id": uuid,
+        "aid": "0",
+        "scy": "auto",
+        "net": "ws",
+        "type": "none",
+        "host": host,
+        "path": path,
+        "tls": tls,
+        "sni": "",
+        "alpn": ""
+    }
+
+    json_str = json.dumps(config, separators=(',', ':'))
+    encoded = base64.b64encode(json_str.encode()).decode()
+    return f"vmess://{encoded}"
+
+def vmess_user_link(user, settings):
+    """vmess:// link for a VMessUser with the panel's VMess settings"""
+    return vmess_link(user.uuid, settings['address'], settings['port'], '/ws',
+                      settings['host'], settings['tls'], user.name)
+
+def ssh_link(user, server_ip):
+    return f"ssh://{user.username}:{user.password}@{server_ip}:22"
+
+def ssh_config_text(user, server_ip):
+    """Plain-text SSH account config"""
+    return f"""# SSH Account Configuration
+# Username: {user.username}
+# Password: {user.password}
+# Server: {server_ip}
+# Port: 22
+# Expiry: {user.expiry_date.strftime('%Y-%m-%d')}
+
+# OpenSSH Command:
+ssh {user.username}@{server_ip}
+
+# HTTP Injector Payload:
+{user.username}:{user.password}@{server_ip}:22
+"""
@@ -28,6 +28,7 @@ class SSHUser(db.Model):
     max_connections = db.Column(db.Integer, default=2)
     is_active = db.Column(db.Boolean, default=True)
     notes = db.Column(db.Text, nullable=True)
+    rate_limit_mbps = db.Column(db.Integer, default=0)  # 0 = unlimited
     
     def is_expired(self):
         return datetime.utcnow() > self.expiry_date
@@ -35,6 +36,22 @@ class SSHUser(db.Model):
     def days_remaining(self):
         delta = self.expiry_date - datetime.utcnow()
         return max(0, delta.days)
+    
+    def get_status(self):
+        if not self.is_active:
+            return 'Disabled'
+        if self.is_expired():
+            return 'Expired'
+        return 'Active'
+    
+    @classmethod
+    def status_expression(cls, now):
+        """SQL equivalent of get_status()"""
+        return db.case(
+            (cls.is_active == False, 'Disabled'),
+            (cls.expiry_date < now, 'Expired'),
+            else_='Active'
+        )
 
 class Connection(db.Model):
     """Active SSH connection tracking"""
@@ -64,6 +81,7 @@ class VMessUser(db.Model):
     expiry_date = db.Column(db.DateTime, nullable=False)
     created_at = db.Column(db.DateTime, default=datetime.utcnow)
     is_active = db.Column(db.Boolean, default=True)
+    rate_limit_mbps = db.Column(db.Integer, default=0)  # 0 = unlimited (stored only, Xray has no per-user shaping)
     
     def __repr__(self):
         return f'<VMessUser {self.name}>'
@@ -85,6 +103,16 @@ class VMessUser(db.Model):
             return 'Data Limit Exceeded'
         return 'Active'
     
+    @classmethod
+    def status_expression(cls, now):
+        """SQL equivalent of get_status()"""
+        return db.case(
+            (cls.is_active == False, 'Disabled'),
+            (cls.expiry_date < now, 'Expired'),
+            (db.and_(cls.data_limit_gb > 0, cls.used_data_gb >= cls.data_limit_gb), 'Data Limit Exceeded'),
+            else_='Active'
+        )
+    
     def days_remaining(self):
         delta = self.expiry_date - datetime.utcnow()
         return max(0, delta.days)
@@ -97,12 +125,13 @@ class OutlineUser(db.Model):
     name = db.Column(db.String(100), nullable=False)
     access_key = db.Column(db.String(500), unique=True, nullable=False)
     password = db.Column(db.String(100), nullable=False)  # Shadowsocks password
-    port = db.Column(db.Integer, nullable=False)
+    port = db.Column(db.Integer, nullable=False, unique=True, index=True)
     method = db.Column(db.String(50), default='chacha20-ietf-poly1305')
     data_limit_gb = db.Column(db.Float, default=0)  # 0 = unlimited
     used_data_gb = db.Column(db.Float, default=0)
     is_active = db.Column(db.Boolean, default=True)
     created_at = db.Column(db.DateTime, default=datetime.utcnow)
+    rate_limit_mbps = db.Column(db.Integer, default=0)  # 0 = unlimited
     
     def get_status(self):
         """Get user status"""
@@ -112,8 +141,61 @@ class OutlineUser(db.Model):
             return 'Quota Exceeded'
         return 'Active'
     
+    @classmethod
+    def status_expression(cls, now):
+        """SQL equivalent of get_status()"""
+        return db.case(
+            (cls.is_active == False, 'Disabled'),
+            (db.and_(cls.data_limit_gb > 0, cls.used_data_gb >= cls.data_limit_gb), 'Quota Exceeded'),
+            else_='Active'
+        )
+    
     def remaining_data_gb(self):
         """Get remaining data in GB"""
         if self.data_limit_gb == 0:
             return float('inf')
         return max(0, self.data_limit_gb - self.used_data_gb)
+
+
+class DashboardCounter(db.Model):
+    """Materialized dashboard counters, one row per account type and status"""
+    __tablename__ = 'dashboard_counters'
+    
+    account_type = db.Column(db.String(20), primary_key=True)  # ssh / vmess / outline
+    status = db.Column(db.String(30), primary_key=True)  # get_status() value
+    count = db.Column(db.Integer, default=0)
+    refreshed_at = db.Column(db.DateTime, default=datetime.utcnow)
+
+class OutlineFreePort(db.Model):
+    """Released Outline ports waiting to be reused (free list)"""
+    __tablename__ = 'outline_free_ports'
+    
+    port = db.Column(db.Integer, primary_key=True)
+
+class ApiToken(db.Model):
+    """Token for the JSON API; only the SHA-256 of the token is stored"""
+    __tablename__ = 'api_tokens'
+    
+    id = db.Column(db.Integer, primary_key=True)
+    name = db.Column(db.String(100), nullable=False)
+    token_hash = db.Column(db.String(64), unique=True, nullable=False)
+    prefix = db.Column(db.String(12), nullable=False)  # shown in listings to tell tokens apart
+    rate_limit = db.Column(db.Integer, default=600)  # requests per minute
+    is_active = db.Column(db.Boolean, default=True)
+    created_at = db.Column(db.DateTime, default=datetime.utcnow)
+
+class RequestProfile(db.Model):
+    """Sampled call stacks of one profiled request (see profiler.py)"""
+    __tablename__ = 'request_profiles'
+    
+    id = db.Column(db.Integer, primary_key=True)
+    route = db.Column(db.String(200), index=True)  # URL rule, e.g. /users/<int:user_id>/delete
+    endpoint = db.Column(db.String(100))
+    method = db.Column(db.String(10))
+    path = db.Column(db.String(500))
+    status_code = db.Column(db.Integer)
+    duration_ms = db.Column(db.Float)
+    interval_ms = db.Column(db.Float)
+    samples = db.Column(db.Integer)
+    stacks = db.Column(db.Text)  # collapsed stacks ("frame;frame;frame count" lines)
+    created_at = db.Column(db.DateTime, default=datetime.utcnow)
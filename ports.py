@@ -0,0 +1,142 @@
+from models import db, OutlineUser, OutlineFreePort, ServerConfig
+from helpers import get_setting
+from sqlalchemy.dialects.sqlite import insert as sqlite_insert
+from datetime import datetime
+import errno
+import socket
+
+# Outline port allocator. Ports come from a configurable range
+# (outline_port_min..outline_port_max in ServerConfig). Released ports go on a
+# free list table and are handed out first; otherwise the high-water mark
+# (outline_port_next) is bumped. Every call works inside the caller's session,
+# so the port is taken in the same transaction that inserts the user row.
+#
+# Workers and API batches allocate concurrently, and a plain SELECT is not
+# part of any transaction under pysqlite. Every claim is therefore a
+# conditional write whose rowcount says whether this transaction got the port:
+# one DELETE per free-list port, and UPDATE ... WHERE value = <value read> for
+# the high-water mark. The unique index on outline_users.port is the backstop.
+#
+# When the range is moved, a mark outside it starts over at the new minimum.
+# Ports that users from an earlier range still hold are passed over.
+
+DEFAULT_PORT_MIN = 8388
+DEFAULT_PORT_MAX = 18387
+NEXT_PORT_KEY = 'outline_port_next'
+MAX_CLAIM_ATTEMPTS = 20
+
+
+class PortRangeExhausted(Exception):
+    """No free port left in the configured Outline range"""
+
+
+def get_port_range():
+    return (int(get_setting('outline_port_min', '') or DEFAULT_PORT_MIN),
+            int(get_setting('outline_port_max', '') or DEFAULT_PORT_MAX))
+
+
+def is_port_bound(port):
+    """True if something on the host already listens on the port (TCP or UDP)"""
+    for kind in (socket.SOCK_STREAM, socket.SOCK_DGRAM):
+        with socket.socket(socket.AF_INET, kind) as sock:
+            try:
+                sock.bind(('0.0.0.0', port))
+            except OSError as e:
+                if e.errno == errno.EADDRINUSE:
+                    return True
+                raise
+    return False
+
+
+def _read_next_port(port_min):
+    """High-water mark, created on first use from the existing users"""
+    value = db.session.scalar(db.select(ServerConfig.value).where(ServerConfig.key == NEXT_PORT_KEY))
+    if value is not None:
+        return int(value)
+
+    # First run: continue after the highest port in use and put the gaps left
+    # by earlier deletes on the free list. A concurrent first run inserts the
+    # same rows, so both inserts ignore conflicts.
+    used = set(db.session.scalars(db.select(OutlineUser.port)))
+    next_port = max(used | {port_min - 1}) + 1
+    free = [port for port in range(port_min, next_port) if port not in used]
+    if free:
+        db.session.execute(sqlite_insert(OutlineFreePort).on_conflict_do_nothing(),
+                           [{'port': port} for port in free])
+    db.session.execute(sqlite_insert(ServerConfig).on_conflict_do_nothing().values(
+        key=NEXT_PORT_KEY, value=str(next_port), updated_at=datetime.utcnow()))
+    return int(db.session.scalar(db.select(ServerConfig.value).where(ServerConfig.key == NEXT_PORT_KEY)))
+
+
+def _claim_free_ports(port_min, port_max, wanted):
+    """Take up to `wanted` ports off the free list"""
+    candidates = db.session.scalars(
+        db.select(OutlineFreePort.port)
+        .where(OutlineFreePort.port.between(port_min, port_max))
+        .order_by(OutlineFreePort.port)
+        .limit(wanted)).all()
+    # A port is ours only if our DELETE removed it
+    return [port for port in candidates
+            if db.session.execute(db.delete(OutlineFreePort).where(OutlineFreePort.port == port)
+                                  .execution_options(synchronize_session=False)).rowcount == 1]
+
+
+def _claim_next_ports(port_min, port_max, wanted):
+    """Move the high-water mark past up to `wanted` new ports"""
+    for _ in range(MAX_CLAIM_ATTEMPTS):
+        current = _read_next_port(port_min)
+        next_port = current if port_min <= current <= port_max + 1 else port_min
+        if next_port > port_max:
+            raise PortRangeExhausted(f'No free Outline port in {port_min}-{port_max}')
+        ports = list(range(next_port, min(next_port + wanted, port_max + 1)))
+        # Compare-and-set: 0 rows means another transaction moved the mark first
+        moved = db.session.execute(
+            db.update(ServerConfig)
+            .where(ServerConfig.key == NEXT_PORT_KEY, ServerConfig.value == str(current))
+            .values(value=str(ports[-1] + 1), updated_at=datetime.utcnow())
+            .execution_options(synchronize_session=False)).rowcount
+        if moved == 1:
+            return ports
+    raise PortRangeExhausted('Outline ports are being allocated concurrently, try again')
+
+
+def allocate_ports(count=1, check_host=True):
+    """Take `count` ports for new users; the caller commits"""
+    port_min, port_max = get_port_range()
+
+    ports = []
+    skipped = []
+    while len(ports) < count:
+        wanted = count - len(ports)
+        # Reuse released ports first, then extend the high-water mark
+        candidates = (_claim_free_ports(port_min, port_max, wanted)
+                      or _claim_next_ports(port_min, port_max, wanted))
+        in_use = set(db.session.scalars(db.select(OutlineUser.port).where(OutlineUser.port.in_(candidates))))
+
+        for port in candidates:
+            if port in in_use:
+                continue
+            if check_host and is_port_bound(port):
+                skipped.append(port)
+            else:
+                ports.append(port)
+
+    # Ports held by something else on the host go back on the free list for later
+    if skipped:
+        db.session.execute(sqlite_insert(OutlineFreePort).on_conflict_do_nothing(),
+                           [{'port': port} for port in skipped])
+    return ports
+
+
+def release_port(port):
+    """Put a deleted user's port back on the free list; the caller commits"""
+    release_ports([port])
+
+
+def release_ports(ports):
+    """Put many ports back on the free list with one insert"""
+    port_min, port_max = get_port_range()
+    ports = sorted({port for port in ports if port_min <= port <= port_max})
+    if ports:
+        db.session.execute(sqlite_insert(OutlineFreePort).on_conflict_do_nothing(),
+                           [{'port': port} for port in ports])
@@ -0,0 +1,153 @@
+from flask import Flask, current_app, g, request
+from flask_login import current_user
+from models import db, RequestProfile
+from collections import Counter
+import os
+import sys
+import threading
+import time
+
+# Opt-in sampling profiler for single requests. A logged-in admin adds
+# ?_profile=1 (or the X-Panel-Profile: 1 header) to any panel URL; while that
+# request runs, a background thread reads the request thread's Python stack
+# every SAMPLE_INTERVAL seconds. The samples are stored as collapsed stacks
+# (the input format of flamegraph.pl and speedscope) in request_profiles,
+# keyed by the route, and listed under /profiles.
+#
+# Requests without the parameter/header pay two dictionary lookups; nothing
+# is sampled, timed or stored for them.
+
+PROFILE_PARAM = '_profile'
+PROFILE_HEADER = 'X-Panel-Profile'
+SAMPLE_INTERVAL = 0.002
+# Newest profiles kept in the database
+PROFILE_KEEP = 200
+
+# Stacks start at Flask's request dispatch, server and WSGI frames are dropped
+_DISPATCH_CODE = Flask.full_dispatch_request.__code__
+
+
+class StackSampler:
+    """Counts the collapsed stacks of one thread, sampled from a second thread"""
+
+    def __init__(self, thread_id, interval=SAMPLE_INTERVAL):
+        self.thread_id = thread_id
+        self.interval = interval
+        self.stacks = Counter()
+        self.samples = 0
+        self._labels = {}
+        self._stop = threading.Event()
+        self._thread = threading.Thread(target=self._run, name='request-profiler', daemon=True)
+
+    def start(self):
+        self._thread.start()
+        return self
+
+    def stop(self):
+        self._stop.set()
+        self._thread.join()
+        return self.stacks
+
+    def _label(self, code):
+        label = self._labels.get(code)
+        if label is None:
+            # ';' separates frames and ' ' the count in the collapsed format
+            name = f'{os.path.basename(code.co_filename)}:{code.co_name}:{code.co_firstlineno}'
+            label = self._labels[code] = name.replace(';', ':').replace(' ', '_')
+        return label
+
+    def _run(self):
+        while not self._stop.wait(self.interval):
+            frame = sys._current_frames().get(self.thread_id)
+            stack = []
+            while frame is not None:
+                stack.append(self._label(frame.f_code))
+                if frame.f_code is _DISPATCH_CODE:
+                    break
+                frame = frame.f_back
+            if stack:
+                stack.reverse()
+                self.stacks[';'.join(stack)] += 1
+                self.samples += 1
+
+
+def collapsed(stacks):
+    """Counter of stacks as collapsed-stack text, heaviest first"""
+    return ''.join(f'{stack} {count}\n' for stack, count in stacks.most_common())
+
+
+def parse_collapsed(text):
+    """[(frames, count)] from collapsed-stack text"""
+    stacks = []
+    for line in text.splitlines():
+        stack, _, count = line.rpartition(' ')
+        if stack and count.isdigit():
+            stacks.append((stack.split(';'), int(count)))
+    return stacks
+
+
+def hot_frames(text, limit=25):
+    """([(frame, self samples)], [(frame, inclusive samples)]), heaviest first"""
+    own, inclusive = Counter(), Counter()
+    for frames, count in parse_collapsed(text):
+        own[frames[-1]] += count
+        # A recursive function counts once per sample
+        for frame in set(frames):
+            inclusive[frame] += count
+    return own.most_common(limit), inclusive.most_common(limit)
+
+
+def profile_requested():
+    return PROFILE_PARAM in request.args or PROFILE_HEADER in request.headers
+
+
+def start_profile():
+    """before_request: start sampling when an admin asked for it"""
+    if not profile_requested() or not current_user.is_authenticated:
+        return
+    g.profile_sampler = StackSampler(threading.get_ident()).start()
+    g.profile_started = time.perf_counter()
+
+
+def _finish(status_code):
+    sampler = g.pop('profile_sampler', None)
+    if sampler is None:
+        return None
+    duration = time.perf_counter() - g.pop('profile_started')
+    stacks = sampler.stop()
+
+    rule = request.url_rule
+    values = dict(
+        route=rule.rule if rule else request.path,
+        endpoint=request.endpoint,
+        method=request.method,
+        path=request.full_path.rstrip('?')[:500],
+        status_code=status_code,
+        duration_ms=duration * 1000,
+        interval_ms=sampler.interval * 1000,
+        samples=sampler.samples,
+        stacks=collapsed(stacks),
+    )
+    try:
+        # Own connection and transaction, the request's session is left alone
+        with db.engine.begin() as connection:
+            profile_id = connection.execute(db.insert(RequestProfile).values(values)).inserted_primary_key[0]
+            connection.execute(db.delete(RequestProfile).where(RequestProfile.id <= profile_id - PROFILE_KEEP))
+    except Exception as e:
+        current_app.logger.error(f'Could not store request profile for {request.path}: {e}')
+        return None
+    return profile_id
+
+
+def finish_profile(response):
+    """after_request: store the profile, point to it in a response header"""
+    profile_id = _finish(response.status_code)
+    if profile_id is not None:
+        response.headers[PROFILE_HEADER + '-Id'] = str(profile_id)
+    return response
+
+
+def abort_profile(error):
+    """teardown_request: store what was sampled when the view raised"""
+    if error is not None:
+        _finish(500)
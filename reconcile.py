@@ -0,0 +1,260 @@
+from flask import current_app
+from models import db, SSHUser, VMessUser, OutlineUser
+from helpers import run_command, script_path, ssh_credentials_error, account_name_error
+from datetime import date, timedelta
+import click
+import glob
+import json
+import os
+
+# Drift reconciler: compare the database with what is actually configured on
+# the host and repair the difference. The host is read in bulk (one pass over
+# /etc/passwd and /etc/shadow, one parse of the Xray config, one systemctl
+# call), the diff is plain set arithmetic, and repairs go out as one batch per
+# subsystem (ssh_batch.sh, manage_vmess.sh sync, outline_batch.sh).
+#
+# Accounts the panel creates carry PANEL_GECOS in the passwd comment field.
+# --prune-ssh only deletes orphans with that mark, and never members of
+# ADMIN_GROUPS, so operator logins survive a prune.
+
+PASSWD_FILE = '/etc/passwd'
+SHADOW_FILE = '/etc/shadow'
+GROUP_FILE = '/etc/group'
+XRAY_CONFIG = '/usr/local/etc/xray/config.json'
+SYSTEMD_DIR = '/etc/systemd/system'
+OUTLINE_UNIT_PREFIX = 'shadowsocks-'
+
+# Regular login accounts; system accounts and nobody (65534) are never touched
+MIN_UID = 1000
+MAX_UID = 60000
+PANEL_GECOS = 'ssh-panel'
+ADMIN_GROUPS = ('sudo', 'admin', 'wheel', 'root')
+
+EPOCH = date(1970, 1, 1)
+
+
+def read_admin_groups(group_file=GROUP_FILE):
+    """({gid}, {member}) of the ADMIN_GROUPS present on the host"""
+    gids, members = set(), set()
+    with open(group_file) as f:
+        for line in f:
+            fields = line.rstrip('\n').split(':')
+            if len(fields) < 4 or fields[0] not in ADMIN_GROUPS or not fields[2].isdigit():
+                continue
+            gids.add(int(fields[2]))
+            members.update(name for name in fields[3].split(',') if name)
+    return gids, members
+
+
+def read_ssh_accounts(passwd_file=PASSWD_FILE, shadow_file=SHADOW_FILE, group_file=GROUP_FILE):
+    """({username: expiry date or None}, {panel-created}, {admins}, expiry known) for regular accounts"""
+    admin_gids, admins = read_admin_groups(group_file)
+    accounts, tagged = {}, set()
+    with open(passwd_file) as f:
+        for line in f:
+            fields = line.rstrip('\n').split(':')
+            if len(fields) < 7 or not fields[2].isdigit() or not fields[3].isdigit():
+                continue
+            if MIN_UID <= int(fields[2]) <= MAX_UID:
+                accounts[fields[0]] = None
+                if fields[4].split(',')[0] == PANEL_GECOS:
+                    tagged.add(fields[0])
+                if int(fields[3]) in admin_gids:
+                    admins.add(fields[0])
+
+    expiry_known = True
+    try:
+        with open(shadow_file) as f:
+            for line in f:
+                fields = line.rstrip('\n').split(':')
+                # Field 8 is the account expiry in days since the epoch
+                if len(fields) >= 8 and fields[0] in accounts and fields[7].isdigit():
+                    accounts[fields[0]] = EPOCH + timedelta(days=int(fields[7]))
+    except OSError:
+        # Every expiry would read as None and look like drift
+        current_app.logger.warning(f'Cannot read {shadow_file}, skipping SSH expiry check')
+        expiry_known = False
+    return accounts, tagged, admins & accounts.keys(), expiry_known
+
+
+def read_xray_uuids(config_file=XRAY_CONFIG):
+    """Client UUIDs across all VMess inbounds of the Xray config"""
+    try:
+        with open(config_file) as f:
+            config = json.load(f)
+    except (OSError, ValueError):
+        return set()
+    uuids = set()
+    for inbound in config.get('inbounds', []):
+        for client in inbound.get('settings', {}).get('clients', []):
+            uuids.add(client.get('id'))
+    return uuids
+
+
+def read_outline_units(systemd_dir=SYSTEMD_DIR):
+    """{name: running} for every shadowsocks-<name> unit file"""
+    prefix = os.path.join(systemd_dir, OUTLINE_UNIT_PREFIX)
+    units = {path[len(prefix):-len('.service')]: False
+             for path in glob.glob(f'{prefix}*.service')}
+
+    success, output, _ = run_command(['systemctl', 'list-units', f'{OUTLINE_UNIT_PREFIX}*',
+                                      '--all', '--no-legend', '--plain', '--type=service'])
+    if success:
+        for line in output.splitlines():
+            fields = line.split(None, 4)
+            if len(fields) < 4 or not fields[0].startswith(OUTLINE_UNIT_PREFIX):
+                continue
+            name = fields[0][len(OUTLINE_UNIT_PREFIX):-len('.service')]
+            if name in units:
+                units[name] = fields[2] == 'active'
+    return units
+
+
+def snapshot_host():
+    ssh, ssh_tagged, ssh_admins, ssh_expiry_known = read_ssh_accounts()
+    return {
+        'ssh': ssh,
+        'ssh_tagged': ssh_tagged,
+        'ssh_admins': ssh_admins,
+        'ssh_expiry_known': ssh_expiry_known,
+        'xray': read_xray_uuids(),
+        'outline': read_outline_units(),
+    }
+
+
+def snapshot_db():
+    """Only the columns the diff needs, as plain tuples"""
+    return {
+        'ssh': {username: (password, expiry_date.date(), is_active)
+                for username, password, expiry_date, is_active in db.session.execute(
+                    db.select(SSHUser.username, SSHUser.password, SSHUser.expiry_date, SSHUser.is_active))},
+        'vmess': set(db.session.scalars(db.select(VMessUser.uuid).where(VMessUser.is_active == True))),
+        'outline': {name: (is_active, port, password)
+                    for name, is_active, port, password in db.session.execute(
+                        db.select(OutlineUser.name, OutlineUser.is_active,
+                                  OutlineUser.port, OutlineUser.password))},
+    }
+
+
+def diff(db_state, host_state):
+    """Work out the drift between database and host; pure, no I/O"""
+    db_ssh, host_ssh = db_state['ssh'], host_state['ssh']
+    # Rows saved before names/passwords were validated are never sent to the
+    # line-based batch scripts, only reported
+    ssh_invalid = sorted(name for name, (password, _, _) in db_ssh.items() if ssh_credentials_error(name, password))
+    ssh_missing = sorted(db_ssh.keys() - host_ssh.keys() - set(ssh_invalid))
+    ssh_orphans = sorted(host_ssh.keys() - db_ssh.keys())
+    # Only accounts the panel created may be deleted, admins never
+    ssh_prunable = sorted(set(ssh_orphans) & host_state['ssh_tagged'] - host_state['ssh_admins'])
+    # Panel users created before the mark existed get it on the next repair
+    ssh_untagged = sorted(db_ssh.keys() & host_ssh.keys() - host_state['ssh_tagged'] - host_state['ssh_admins'])
+    # Without /etc/shadow there is nothing to compare the expiry dates with
+    ssh_expiry = sorted(name for name in db_ssh.keys() & host_ssh.keys()
+                        if host_ssh[name] != db_ssh[name][1]) if host_state['ssh_expiry_known'] else []
+
+    vmess_missing = sorted(db_state['vmess'] - host_state['xray'])
+    vmess_orphans = sorted(host_state['xray'] - db_state['vmess'])
+
+    db_outline, host_outline = db_state['outline'], host_state['outline']
+    outline_invalid = sorted(name for name in db_outline if account_name_error(name))
+    wanted = {name for name, (is_active, _, _) in db_outline.items() if is_active}
+    running = {name for name, is_running in host_outline.items() if is_running}
+    outline_missing = sorted(wanted - running - set(outline_invalid))
+    outline_orphans = sorted(host_outline.keys() - db_outline.keys())
+    outline_disabled = sorted((host_outline.keys() & db_outline.keys()) - wanted)
+
+    return {
+        'ssh_missing': ssh_missing,
+        'ssh_orphans': ssh_orphans,
+        'ssh_prunable': ssh_prunable,
+        'ssh_untagged': ssh_untagged,
+        'ssh_expiry': ssh_expiry,
+        'ssh_invalid': ssh_invalid,
+        'vmess_missing': vmess_missing,
+        'vmess_orphans': vmess_orphans,
+        'outline_missing': outline_missing,
+        'outline_orphans': outline_orphans,
+        'outline_disabled': outline_disabled,
+        'outline_invalid': outline_invalid,
+    }
+
+
+def plan_repairs(drift, db_state, prune_ssh=False):
+    """Batch scripts to feed to the host, keyed by subsystem"""
+    db_ssh, db_outline = db_state['ssh'], db_state['outline']
+
+    ssh_lines = []
+    for name in drift['ssh_missing']:
+        password, expiry, is_active = db_ssh[name]
+        # The stored date as is: expired users come back already expired
+        ssh_lines.append(f'create {name} {expiry.isoformat()} {password}')
+        if not is_active:
+            ssh_lines.append(f'lock {name}')
+    for name in drift['ssh_expiry']:
+        ssh_lines.append(f'expire {name} {db_ssh[name][1].isoformat()}')
+    ssh_lines.extend(f'tag {name}' for name in drift['ssh_untagged'])
+    if prune_ssh:
+        ssh_lines.extend(f'delete {name}' for name in drift['ssh_prunable'])
+
+    outline_lines = []
+    for name in drift['outline_missing']:
+        _, port, password = db_outline[name]
+        outline_lines.append(f'start {port} {password} {name}')
+    outline_lines.extend(f'stop {name}' for name in drift['outline_orphans'] + drift['outline_disabled'])
+
+    return {
+        'ssh': ssh_lines,
+        'vmess': bool(drift['vmess_missing'] or drift['vmess_orphans']),
+        'outline': outline_lines,
+    }
+
+
+def apply_repairs(plan):
+    """One host call per subsystem; returns {subsystem: (success, output)}"""
+    results = {}
+    if plan['ssh']:
+        success, output, error = run_command([script_path('ssh_batch.sh')], timeout=600,
+                                             input='\n'.join(plan['ssh']) + '\n')
+        results['ssh'] = (success, output + error)
+    if plan['vmess']:
+        success, output, error = run_command([script_path('manage_vmess.sh'), 'sync'], timeout=60)
+        results['vmess'] = (success, output + error)
+    if plan['outline']:
+        success, output, error = run_command([script_path('outline_batch.sh')], timeout=600,
+                                             input='\n'.join(plan['outline']) + '\n')
+        results['outline'] = (success, output + error)
+    return results
+
+
+def reconcile(apply=False, prune_ssh=False):
+    """Snapshot, diff and (optionally) repair; returns (drift, plan, results)"""
+    db_state = snapshot_db()
+    host_state = snapshot_host()
+    drift = diff(db_state, host_state)
+    plan = plan_repairs(drift, db_state, prune_ssh=prune_ssh)
+    results = apply_repairs(plan) if apply else {}
+    return drift, plan, results
+
+
+@click.command('reconcile')
+@click.option('--apply', is_flag=True, help='Repair the drift (default: report only)')
+@click.option('--prune-ssh', is_flag=True, help='Also delete panel-created system accounts no longer in the panel')
+def reconcile_command(apply, prune_ssh):
+    """Compare the panel database with passwd/shadow, Xray and systemd"""
+    drift, plan, results = reconcile(apply=apply, prune_ssh=prune_ssh)
+
+    for key, names in drift.items():
+        click.echo(f'{key:<18} {len(names):>6}  {" ".join(names[:10])}{" ..." if len(names) > 10 else ""}')
+
+    click.echo(f"\nPlanned: {len(plan['ssh'])} SSH changes, "
+               f"{'one' if plan['vmess'] else 'no'} Xray sync, {len(plan['outline'])} Outline changes")
+    if drift['ssh_orphans'] and not prune_ssh:
+        click.echo(f"SSH orphans are only reported; --prune-ssh deletes the {len(drift['ssh_prunable'])} "
+                   f"created by the panel (never unmarked accounts or {'/'.join(ADMIN_GROUPS)} members)")
+
+    if not apply:
+        click.echo('Dry run, nothing changed (use --apply)')
+    for subsystem, (success, output) in results.items():
+        click.echo(f"\n[{subsystem}] {'OK' if success else 'FAILED'}")
+        if output.strip():
+            click.echo(output.rstrip())
@@ -0,0 +1,74 @@
+from flask import current_app
+from models import db
+import click
+
+# db.create_all() only creates missing tables. Columns added to existing models
+# since a database was created (e.g. rate_limit_mbps) are added here with
+# ALTER TABLE ... ADD COLUMN, using the column's scalar default, and missing
+# indexes (e.g. the unique one on outline_users.port) are created.
+
+
+def missing_columns():
+    """[(table, column)] defined on the models but absent from the database"""
+    inspector = db.inspect(db.engine)
+    missing = []
+    for table in db.metadata.sorted_tables:
+        if not inspector.has_table(table.name):
+            continue
+        existing = {column['name'] for column in inspector.get_columns(table.name)}
+        missing.extend((table, column) for column in table.columns if column.name not in existing)
+    return missing
+
+
+def missing_indexes():
+    """Indexes defined on the models but absent from the database"""
+    inspector = db.inspect(db.engine)
+    missing = []
+    for table in db.metadata.sorted_tables:
+        if not inspector.has_table(table.name):
+            continue
+        existing = {index['name'] for index in inspector.get_indexes(table.name)}
+        missing.extend(index for index in table.indexes if index.name not in existing)
+    return missing
+
+
+def upgrade_schema():
+    """Add missing columns and indexes; returns what was added"""
+    added = []
+    preparer = db.engine.dialect.identifier_preparer
+    for table, column in missing_columns():
+        default = column.default.arg if column.default is not None and column.default.is_scalar else None
+        if not column.nullable and default is None:
+            current_app.logger.warning(f'Cannot add NOT NULL column {table.name}.{column.name} without a default')
+            continue
+
+        ddl = (f'ALTER TABLE {preparer.quote(table.name)} ADD COLUMN {preparer.quote(column.name)} '
+               f'{column.type.compile(dialect=db.engine.dialect)}')
+        if default is not None:
+            ddl += f' DEFAULT {db.literal(default).compile(dialect=db.engine.dialect, compile_kwargs={"literal_binds": True})}'
+        with db.engine.begin() as connection:
+            connection.exec_driver_sql(ddl)
+        added.append(f'{table.name}.{column.name}')
+
+    for index in missing_indexes():
+        try:
+            index.create(db.engine)
+        except db.exc.IntegrityError as e:
+            # e.g. duplicate ports left by older versions; fix the rows and run init-db again
+            current_app.logger.warning(f'Cannot create unique index {index.name}: {e.orig}')
+            continue
+        added.append(f'index {index.name}')
+    return added
+
+
+def init_db():
+    """Create missing tables, then missing columns"""
+    db.create_all()
+    return upgrade_schema()
+
+
+@click.command('init-db')
+def init_db_command():
+    """Create or upgrade the database schema"""
+    added = init_db()
+    click.echo(f"Schema up to date{': added ' + ', '.join(added) if added else ''}")
@@ -0,0 +1,29 @@
+#!/bin/bash
+# Apply the bandwidth shaping rendered by shaping.py in one go. Reads stdin:
+# an nftables ruleset, a "#### tc" line, then a tc batch whose "qdisc del"
+# lines clear the previous state.
+# Usage: apply_shaping.sh [IFB_DEVICE]
+
+IFB=${1:-ifb0}
+TMP=$(mktemp -d)
+trap 'rm -rf "$TMP"' EXIT
+
+awk -v dir="$TMP" '
+    /^#### tc$/ { tc = 1; next }
+    !tc { print > (dir "/rules.nft"); next }
+    /^qdisc del / { print > (dir "/tc-del.batch"); next }
+    { print > (dir "/tc.batch") }'
+touch "$TMP/rules.nft" "$TMP/tc-del.batch" "$TMP/tc.batch"
+
+# Ingress is shaped on an IFB device
+modprobe ifb numifbs=0 2>/dev/null
+ip link show "$IFB" >/dev/null 2>&1 || ip link add "$IFB" type ifb || exit 1
+ip link set "$IFB" up || exit 1
+
+# Marks first (one atomic nft transaction), then the classes that use them.
+nft -f "$TMP/rules.nft" || exit 1
+# The qdiscs to delete may not exist yet, so this batch's status is ignored
+tc -force -batch "$TMP/tc-del.batch" 2>/dev/null
+# The adds stop at the first error and decide the result
+[ -s "$TMP/tc.batch" ] || exit 0
+tc -batch "$TMP/tc.batch"
@@ -0,0 +1,124 @@
+#!/usr/bin/env python3
+"""Online backup under write load.
+
+Fills a scratch database with USERS SSH users, keeps WRITERS threads
+updating it (one commit every INTERVAL ms each) and takes backups meanwhile.
+Reports the backup time and copy restarts, the write latency while backups
+ran, and checks every backup with PRAGMA integrity_check and its user count;
+exits non-zero if any backup fails either check.
+
+Usage: bench_backup.py [BACKUPS] [USERS] [WRITERS] [INTERVAL_MS]
+"""
+import gzip
+import os
+import shutil
+import sqlite3
+import statistics
+import sys
+import tempfile
+import threading
+import time
+
+PANEL_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, PANEL_DIR)
+
+BACKUPS = int(sys.argv[1]) if len(sys.argv) > 1 else 5
+USERS = int(sys.argv[2]) if len(sys.argv) > 2 else 20000
+WRITERS = int(sys.argv[3]) if len(sys.argv) > 3 else 3
+INTERVAL_MS = float(sys.argv[4]) if len(sys.argv) > 4 else 20
+
+def fill(app):
+    from datetime import datetime
+    from models import db, SSHUser
+    with app.app_context():
+        db.create_all()
+        db.session.execute(db.insert(SSHUser), [
+            {'username': f'user{i}', 'password': 'x' * 16, 'expiry_date': datetime.utcnow(), 'notes': 'n' * 200}
+            for i in range(USERS)])
+        db.session.commit()
+
+def writer(path, number, stop, latencies):
+    connection = sqlite3.connect(path, timeout=30)
+    i = 0
+    while not stop.is_set():
+        t0 = time.perf_counter()
+        connection.execute('UPDATE ssh_user SET notes = ? WHERE id = ?',
+                           (f'writer {number} #{i}', 1 + (i * WRITERS + number) % USERS))
+        connection.commit()
+        latencies.append(time.perf_counter() - t0)
+        i += 1
+        time.sleep(INTERVAL_MS / 1000)
+    connection.close()
+
+def integrity(path):
+    if path.endswith('.gz'):
+        plain = path[:-3] + '.check'
+        with gzip.open(path, 'rb') as f_in, open(plain, 'wb') as f_out:
+            shutil.copyfileobj(f_in, f_out)
+        path = plain
+    connection = sqlite3.connect(path)
+    result = connection.execute('PRAGMA integrity_check').fetchone()[0]
+    count = connection.execute('SELECT count(*) FROM ssh_user').fetchone()[0]
+    connection.close()
+    return result, count
+
+def report(name, samples):
+    samples_ms = sorted(s * 1000 for s in samples)
+    print(f'{name:<14} median {statistics.median(samples_ms):8.1f} ms   '
+          f'p99 {samples_ms[int(len(samples_ms) * 0.99)]:8.1f} ms   max {samples_ms[-1]:8.1f} ms')
+
+def main():
+    tmp = tempfile.mkdtemp()
+    db_path = f'{tmp}/bench.db'
+    os.environ['DATABASE_URL'] = f'sqlite:///{db_path}'
+    os.environ['PANEL_BACKUP_DIR'] = f'{tmp}/backups'
+    os.environ['PANEL_SNAPSHOT_DIR'] = f'{tmp}/snapshots'
+
+    from app import create_app
+    from backup import backup_database
+    app = create_app()
+    fill(app)
+    print(f'{USERS} users, {os.path.getsize(db_path) / 1e6:.1f} MB, '
+          f'{WRITERS} writers every {INTERVAL_MS:g} ms, {BACKUPS} backups')
+
+    latencies = []
+    stop = threading.Event()
+    threads = [threading.Thread(target=writer, args=(db_path, n, stop, latencies)) for n in range(WRITERS)]
+    for thread in threads:
+        thread.start()
+    time.sleep(1)
+    idle_count = len(latencies)
+    during = []
+
+    durations, restarts, paths = [], [], []
+    with app.app_context():
+        for _ in range(BACKUPS):
+            start = len(latencies)
+            t0 = time.perf_counter()
+            path, restart_count = backup_database(keep=0)
+            durations.append(time.perf_counter() - t0)
+            during.extend(latencies[start:])
+            restarts.append(restart_count)
+            paths.append(path)
+    stop.set()
+    for thread in threads:
+        thread.join()
+
+    report('backup', durations)
+    print(f'{"restarts":<14} {restarts}')
+    report('write (idle)', latencies[:idle_count])
+    if during:
+        report('write (backup)', during)
+    failed = 0
+    for path in paths:
+        result, count = integrity(path)
+        ok = result == 'ok' and count == USERS
+        failed += not ok
+        print(f'{os.path.basename(path):<36} {result:<4} {count} users{"" if ok else "  FAILED"}')
+    if len(set(paths)) != len(paths):
+        print('Backups overwrote each other')
+        failed += 1
+    return 1 if failed else 0
+
+if __name__ == '__main__':
+    sys.exit(main())
@@ -0,0 +1,129 @@
+#!/usr/bin/env python3
+"""Concurrency benchmark: 3 gunicorn sync workers vs. the threaded uvicorn mode.
+
+Fires CONCURRENCY simultaneous "create SSH user" requests (whose system
+script is replaced by a `sleep`, standing in for useradd/systemctl) plus the
+same number of plain page loads, and reports wall time and latency for both
+serving modes. Runs against a throwaway database; nothing on the host changes.
+
+The uvicorn mode runs with PANEL_THREADS request threads. Keep CONCURRENCY
+above it (the default is twice as many) to see requests queue for a thread:
+the slow requests then take about CONCURRENCY / PANEL_THREADS script runs.
+
+Usage: bench_concurrency.py [CONCURRENCY] [SCRIPT_SECONDS] [PANEL_THREADS]   (needs gunicorn and uvicorn)
+"""
+import http.cookiejar
+import os
+import socket
+import statistics
+import subprocess
+import sys
+import tempfile
+import time
+import urllib.parse
+import urllib.request
+from concurrent.futures import ThreadPoolExecutor
+
+PANEL_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, PANEL_DIR)
+
+CONCURRENCY = int(sys.argv[1]) if len(sys.argv) > 1 else 64
+SCRIPT_SECONDS = float(sys.argv[2]) if len(sys.argv) > 2 else 0.5
+PANEL_THREADS = int(sys.argv[3]) if len(sys.argv) > 3 else 32
+PORT = 5099
+
+MODES = {
+    'gunicorn sync x3': ['gunicorn', '-c', 'gunicorn.conf.py', '--bind', f'127.0.0.1:{PORT}',
+                         '--timeout', '120', 'app:create_app()'],
+    f'uvicorn {PANEL_THREADS} thr': ['uvicorn', 'asgi:application', '--host', '127.0.0.1', '--port', str(PORT),
+                                     '--lifespan', 'off', '--log-level', 'warning'],
+}
+
+def prepare(tmp):
+    """Throwaway database with an admin, and slow stand-in scripts"""
+    os.environ['DATABASE_URL'] = f'sqlite:///{tmp}/bench.db'
+    os.environ['PANEL_THREADS'] = str(PANEL_THREADS)
+    scripts = os.path.join(tmp, 'scripts')
+    os.mkdir(scripts)
+    with open(os.path.join(scripts, 'create_ssh_user.sh'), 'w') as f:
+        f.write(f'#!/bin/sh\nsleep {SCRIPT_SECONDS}\n')
+    os.chmod(os.path.join(scripts, 'create_ssh_user.sh'), 0o755)
+    os.environ['PANEL_SCRIPTS_DIR'] = scripts
+
+    from app import create_app
+    from models import db, Admin
+    app = create_app()
+    with app.app_context():
+        db.create_all()
+        admin = Admin(username='bench')
+        admin.set_password('bench')
+        db.session.add(admin)
+        db.session.commit()
+
+def wait_for_port(timeout=15):
+    deadline = time.time() + timeout
+    while time.time() < deadline:
+        try:
+            socket.create_connection(('127.0.0.1', PORT), 0.2).close()
+            return
+        except OSError:
+            time.sleep(0.1)
+    raise RuntimeError('server did not start')
+
+def login():
+    """Session cookie header for the bench admin"""
+    jar = http.cookiejar.CookieJar()
+    opener = urllib.request.build_opener(urllib.request.HTTPCookieProcessor(jar))
+    data = urllib.parse.urlencode({'username': 'bench', 'password': 'bench'}).encode()
+    opener.open(f'http://127.0.0.1:{PORT}/login', data)
+    return '; '.join(f'{c.name}={c.value}' for c in jar)
+
+class NoRedirect(urllib.request.HTTPRedirectHandler):
+    def redirect_request(self, *args, **kwargs):
+        return None
+
+def timed_request(cookie, path, data=None):
+    opener = urllib.request.build_opener(NoRedirect)
+    req = urllib.request.Request(f'http://127.0.0.1:{PORT}{path}', data, {'Cookie': cookie})
+    t0 = time.perf_counter()
+    try:
+        opener.open(req, timeout=120).read()
+    except urllib.error.HTTPError as e:
+        if e.code != 302:
+            raise
+    return time.perf_counter() - t0
+
+def run_mode(name, command):
+    server = subprocess.Popen(command, cwd=PANEL_DIR, stdout=subprocess.DEVNULL, stderr=subprocess.DEVNULL)
+    try:
+        wait_for_port()
+        cookie = login()
+
+        slow, fast = [], []
+        t0 = time.perf_counter()
+        with ThreadPoolExecutor(CONCURRENCY * 2) as pool:
+            slow_jobs = [pool.submit(timed_request, cookie, '/users/create',
+                                     urllib.parse.urlencode({'username': f'{name[:4]}{i}',
+                                                             'password': 'x', 'days': '30'}).encode())
+                         for i in range(CONCURRENCY)]
+            fast_jobs = [pool.submit(timed_request, cookie, '/login') for _ in range(CONCURRENCY)]
+            slow = [job.result() for job in slow_jobs]
+            fast = [job.result() for job in fast_jobs]
+        wall = time.perf_counter() - t0
+
+        print(f'{name:<18} wall {wall:6.2f} s   '
+              f'slow p50 {statistics.median(slow) * 1000:7.0f} ms  max {max(slow) * 1000:7.0f} ms   '
+              f'fast p50 {statistics.median(fast) * 1000:7.0f} ms  max {max(fast) * 1000:7.0f} ms')
+    finally:
+        server.terminate()
+        server.wait()
+
+def main():
+    prepare(tempfile.mkdtemp())
+    print(f'{CONCURRENCY} slow requests ({SCRIPT_SECONDS} s script) + {CONCURRENCY} page loads, '
+          f'{PANEL_THREADS} uvicorn threads')
+    for name, command in MODES.items():
+        run_mode(name, command)
+
+if __name__ == '__main__':
+    main()
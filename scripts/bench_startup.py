@@ -0,0 +1,85 @@
+#!/usr/bin/env python3
+"""Startup benchmark for the panel.
+
+Measures:
+  cold start   - fresh interpreter importing the app and calling create_app()
+  respawn      - time for a forked worker to serve its first request, with the
+                 app preloaded in the parent (gunicorn --preload) vs. without
+
+Usage: bench_startup.py [RUNS]   (run from the panel directory)
+"""
+import os
+import subprocess
+import statistics
+import sys
+import tempfile
+import time
+
+PANEL_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, PANEL_DIR)
+
+RUNS = int(sys.argv[1]) if len(sys.argv) > 1 else 10
+
+COLD_START = """
+import time
+t0 = time.perf_counter()
+from app import create_app
+create_app()
+print(time.perf_counter() - t0)
+"""
+
+def cold_start():
+    """Import + create_app in a new interpreter, seconds"""
+    out = subprocess.run([sys.executable, '-c', COLD_START], cwd=PANEL_DIR,
+                         capture_output=True, text=True, check=True)
+    return float(out.stdout.strip().splitlines()[-1])
+
+def first_request(app):
+    app.test_client().get('/login')
+
+def respawn(preloaded_app):
+    """Fork a worker and wait until it has served one request, seconds"""
+    read_fd, write_fd = os.pipe()
+    t0 = time.perf_counter()
+    pid = os.fork()
+    if pid == 0:
+        os.close(read_fd)
+        if preloaded_app is None:
+            from app import create_app
+            app = create_app()
+        else:
+            from app import dispose_db_connections
+            app = preloaded_app
+            dispose_db_connections(app)
+        first_request(app)
+        os.write(write_fd, b'1')
+        os._exit(0)
+    os.close(write_fd)
+    os.read(read_fd, 1)
+    elapsed = time.perf_counter() - t0
+    os.close(read_fd)
+    os.waitpid(pid, 0)
+    return elapsed
+
+def report(name, samples):
+    samples_ms = [s * 1000 for s in samples]
+    print(f'{name:<22} median {statistics.median(samples_ms):8.1f} ms   '
+          f'min {min(samples_ms):8.1f} ms   max {max(samples_ms):8.1f} ms')
+
+def main():
+    tmp = tempfile.mkdtemp()
+    os.environ['DATABASE_URL'] = f'sqlite:///{tmp}/bench.db'
+
+    print(f'{RUNS} runs each')
+    report('cold start', [cold_start() for _ in range(RUNS)])
+
+    # Respawn without preload: the child imports everything itself. The parent
+    # must not have imported the app yet, so measure this first.
+    report('respawn (no preload)', [respawn(None) for _ in range(RUNS)])
+
+    from app import create_app
+    app = create_app()
+    report('respawn (preload)', [respawn(app) for _ in range(RUNS)])
+
+if __name__ == '__main__':
+    main()
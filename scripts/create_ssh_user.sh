@@ -3,9 +3,10 @@ USERNAME=$1
 PASSWORD=$2
 DAYS=$3
 
-# Create user
-useradd -m -s /bin/bash "$USERNAME"
-echo "$USERNAME:$PASSWORD" | chpasswd
+# Create user; never set a password on an account that already existed
+# The GECOS mark tells the reconciler this account belongs to the panel
+useradd -m -s /bin/bash -c ssh-panel "$USERNAME" || exit 1
+echo "$USERNAME:$PASSWORD" | chpasswd || exit 1
 
 # Set expiry
 if [ -n "$DAYS" ] && [ "$DAYS" -gt 0 ]; then
@@ -4,7 +4,12 @@ USERNAME=$1
 # Kill user processes
 pkill -u "$USERNAME" 2>/dev/null
 
-# Delete user
+# Delete user (6 = no such user, already gone)
 userdel -r "$USERNAME" 2>/dev/null
+STATUS=$?
+if [ $STATUS -ne 0 ] && [ $STATUS -ne 6 ]; then
+    echo "Failed to delete SSH user $USERNAME (userdel exit $STATUS)" >&2
+    exit 1
+fi
 
 echo "SSH user $USERNAME deleted"
@@ -4,9 +4,14 @@ UUID=$2
 
 CONFIG_FILE="/usr/local/etc/xray/config.json"
 
+# One regeneration at a time across all panel workers, so runs never
+# interleave their writes to the config or restart Xray mid-write
+exec 9>/run/lock/ssh-panel-xray.lock
+flock 9
+
 regenerate_config() {
-    # Get all UUIDs from database
-    UUIDS=$(sqlite3 /opt/ssh-panel/instance/ssh_panel.db "SELECT uuid FROM vmess_user;" 2>/dev/null | tr '\n' ' ')
+    # Get all enabled UUIDs from database
+    UUIDS=$(sqlite3 /opt/ssh-panel/instance/ssh_panel.db "SELECT uuid FROM vmess_users WHERE is_active = 1;" 2>/dev/null | tr '\n' ' ')
     
     # Generate new config
     cat > $CONFIG_FILE << XRAYCONF
@@ -51,11 +56,11 @@ XRAYCONF
 }
 
 case "$ACTION" in
-    add|remove)
+    add|remove|sync)
         regenerate_config
         ;;
     *)
-        echo "Usage: $0 {add|remove} UUID"
+        echo "Usage: $0 {add|remove|sync} [UUID]"
         exit 1
         ;;
 esac
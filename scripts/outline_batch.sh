@@ -0,0 +1,82 @@
+#!/bin/bash
+# Start/stop Shadowsocks units for many Outline users at once. Reads stdin:
+#   start PORT PASSWORD NAME
+#   stop NAME
+# Units are written/removed first, then systemd is reloaded and the units are
+# started/stopped with one systemctl call each.
+# Prints "OK <action> <name>" or "FAILED <action> <name>" per line.
+
+START_UNITS=()
+START_NAMES=()
+STOP_UNITS=()
+STOP_NAMES=()
+PORTS=()
+
+# Unit changes and systemd reloads one at a time (shared with start_outline_server.sh)
+exec 9>/run/lock/ssh-panel-outline.lock
+flock 9
+
+while read -r ACTION ARG1 ARG2 ARG3; do
+    case "$ACTION" in
+        start)
+            PORT=$ARG1
+            PASSWORD=$ARG2
+            USERNAME=$ARG3
+            SERVICE_NAME="shadowsocks-$USERNAME"
+            cat > "/etc/systemd/system/$SERVICE_NAME.service" << SERVICEEOF
+[Unit]
+Description=Shadowsocks Server for $USERNAME
+After=network.target
+
+[Service]
+Type=simple
+ExecStart=/usr/bin/ss-server -s 0.0.0.0 -p $PORT -k $PASSWORD -m chacha20-ietf-poly1305
+Restart=on-failure
+
+[Install]
+WantedBy=multi-user.target
+SERVICEEOF
+            START_UNITS+=("$SERVICE_NAME")
+            START_NAMES+=("$USERNAME")
+            PORTS+=("$PORT")
+            ;;
+        stop)
+            USERNAME="$ARG1${ARG2:+ $ARG2}${ARG3:+ $ARG3}"
+            STOP_UNITS+=("shadowsocks-$USERNAME")
+            STOP_NAMES+=("$USERNAME")
+            ;;
+    esac
+done
+
+FAILED=0
+
+if [ ${#STOP_UNITS[@]} -gt 0 ]; then
+    systemctl disable --now "${STOP_UNITS[@]}" 2>/dev/null
+    for i in "${!STOP_UNITS[@]}"; do
+        rm -f "/etc/systemd/system/${STOP_UNITS[$i]}.service"
+        echo "OK stop ${STOP_NAMES[$i]}"
+    done
+fi
+
+systemctl daemon-reload
+
+if [ ${#START_UNITS[@]} -gt 0 ]; then
+    systemctl enable "${START_UNITS[@]}" 2>/dev/null
+    systemctl restart "${START_UNITS[@]}"
+
+    for PORT in "${PORTS[@]}"; do
+        ufw allow "$PORT/tcp" 2>/dev/null
+        ufw allow "$PORT/udp" 2>/dev/null
+    done
+
+    for i in "${!START_UNITS[@]}"; do
+        if systemctl is-active --quiet "${START_UNITS[$i]}"; then
+            echo "OK start ${START_NAMES[$i]}"
+        else
+            echo "FAILED start ${START_NAMES[$i]}"
+            FAILED=1
+        fi
+    done
+fi
+
+exit $FAILED
@@ -0,0 +1,66 @@
+#!/bin/bash
+# Apply SSH account changes read from stdin, one per line:
+#   create USERNAME YYYY-MM-DD PASSWORD   (account expiry date, may be in the past)
+#   expire USERNAME YYYY-MM-DD
+#   lock USERNAME
+#   unlock USERNAME
+#   tag USERNAME                          (mark an older account as panel-managed)
+#   delete USERNAME
+# Accounts created here carry the GECOS comment $PANEL_GECOS; the reconciler
+# only ever prunes accounts with that mark.
+# Prints "OK <action> <user>" or "FAILED <action> <user>" per line.
+
+PANEL_GECOS=ssh-panel
+FAILED=0
+
+report() {
+    if [ "$1" -eq 0 ]; then
+        echo "OK $2 $3"
+    else
+        echo "FAILED $2 $3"
+        FAILED=1
+    fi
+}
+
+while read -r ACTION USERNAME ARG1 ARG2; do
+    [ -z "$ACTION" ] && continue
+    case "$ACTION" in
+        create)
+            useradd -m -s /bin/bash -c "$PANEL_GECOS" "$USERNAME" && echo "$USERNAME:$ARG2" | chpasswd \
+                && chage -E "$ARG1" "$USERNAME"
+            report $? create "$USERNAME"
+            ;;
+        expire)
+            chage -E "$ARG1" "$USERNAME"
+            report $? expire "$USERNAME"
+            ;;
+        lock)
+            usermod -L "$USERNAME"
+            STATUS=$?
+            # pkill exits 1 when the user had no sessions, which is fine
+            [ $STATUS -eq 0 ] && pkill -u "$USERNAME" 2>/dev/null
+            report $STATUS lock "$USERNAME"
+            ;;
+        unlock)
+            usermod -U "$USERNAME"
+            report $? unlock "$USERNAME"
+            ;;
+        tag)
+            usermod -c "$PANEL_GECOS" "$USERNAME"
+            report $? tag "$USERNAME"
+            ;;
+        delete)
+            pkill -u "$USERNAME" 2>/dev/null
+            userdel -r "$USERNAME" 2>/dev/null
+            STATUS=$?
+            # 6 = user does not exist, already gone
+            [ $STATUS -eq 6 ] && STATUS=0
+            report $STATUS delete "$USERNAME"
+            ;;
+        *)
+            report 1 "$ACTION" "$USERNAME"
+            ;;
+    esac
+done
+
+exit $FAILED
@@ -5,6 +5,10 @@ PORT=$3
 
 SERVICE_NAME="shadowsocks-$USERNAME"
 
+# Unit changes and systemd reloads one at a time (shared with outline_batch.sh)
+exec 9>/run/lock/ssh-panel-outline.lock
+flock 9
+
 # Create systemd service
 cat > /etc/systemd/system/$SERVICE_NAME.service << SERVICEEOF
 [Unit]
@@ -0,0 +1,239 @@
+from collections import namedtuple
+from flask import current_app
+from models import db, SSHUser, OutlineUser
+from helpers import run_command, script_path, get_setting
+from reconcile import PASSWD_FILE, MIN_UID, MAX_UID
+import click
+import sysexec
+
+# Per-user bandwidth shaping. Every limited account gets an HTB class with
+# rate = ceil = its limit and a firewall mark; nftables puts the mark on its
+# packets and tc classifies on it:
+#   SSH      sockets owned by the user's UID (meta skuid), i.e. the tunnelled
+#            connections; the mark is saved in conntrack so replies match too
+#   Outline  the user's ss-server port (sport on the way out, dport on the way in)
+# Egress is shaped on the uplink interface, ingress by redirecting it to an IFB
+# device (restoring the conntrack mark first). The whole state is rendered as
+# one nft ruleset and one tc batch and applied with a single script call, so
+# the cost does not grow with the number of commands per user. VMess users all
+# share the Xray port, so their rate_limit_mbps is stored but not enforced.
+
+NFT_TABLE = 'ssh_panel_shaping'
+# Panel marks are PANEL_MARK | class minor, so other marks on the host are left alone
+PANEL_MARK = 0x5a0000
+PANEL_MARK_MASK = 0xff0000
+FIRST_MINOR = 0x10
+DEFAULT_MINOR = 0xfffe
+
+DEFAULT_IFB = 'ifb0'
+# Link speed reported by the kernel, -1 or unreadable for most virtual NICs
+SPEED_FILE = '/sys/class/net/{}/speed'
+
+ShapingRule = namedtuple('ShapingRule', 'kind name rate_mbps minor mark uid port')
+
+
+def read_uids(passwd_file=PASSWD_FILE):
+    """{username: uid} for regular accounts"""
+    uids = {}
+    with open(passwd_file) as f:
+        for line in f:
+            fields = line.split(':')
+            if len(fields) >= 3 and fields[2].isdigit() and MIN_UID <= int(fields[2]) <= MAX_UID:
+                uids[fields[0]] = int(fields[2])
+    return uids
+
+
+def collect_rules(uids):
+    """ShapingRules for every active, limited SSH and Outline user"""
+    rules = []
+    minor = FIRST_MINOR
+
+    for username, rate in db.session.execute(
+            db.select(SSHUser.username, SSHUser.rate_limit_mbps)
+            .where(SSHUser.rate_limit_mbps > 0, SSHUser.is_active == True)
+            .order_by(SSHUser.id)):
+        if username not in uids:
+            # No system account (yet), the reconciler reports it
+            continue
+        rules.append(ShapingRule('ssh', username, rate, minor, PANEL_MARK | minor, uids[username], None))
+        minor += 1
+
+    for name, port, rate in db.session.execute(
+            db.select(OutlineUser.name, OutlineUser.port, OutlineUser.rate_limit_mbps)
+            .where(OutlineUser.rate_limit_mbps > 0, OutlineUser.is_active == True)
+            .order_by(OutlineUser.id)):
+        rules.append(ShapingRule('outline', name, rate, minor, PANEL_MARK | minor, None, port))
+        minor += 1
+
+    if minor >= DEFAULT_MINOR:
+        raise ValueError(f'Too many shaped users ({len(rules)}), at most {DEFAULT_MINOR - FIRST_MINOR}')
+    return rules
+
+
+def render_nft(rules):
+    """nftables ruleset that (re)creates the marking table in one transaction"""
+    # Declaring the table first makes the delete safe when it does not exist yet
+    lines = [f'table inet {NFT_TABLE}', f'delete table inet {NFT_TABLE}']
+    if not rules:
+        return '\n'.join(lines) + '\n'
+
+    uid_marks = ', '.join(f'{rule.uid} : {rule.mark:#x}' for rule in rules if rule.kind == 'ssh')
+    port_marks = ', '.join(f'{rule.port} : {rule.mark:#x}' for rule in rules if rule.kind == 'outline')
+    save = f'meta mark & {PANEL_MARK_MASK:#x} == {PANEL_MARK:#x} ct mark set meta mark'
+
+    lines += [
+        f'table inet {NFT_TABLE} {{',
+        '    map uid_marks {',
+        '        type uid : mark',
+        *([f'        elements = {{ {uid_marks} }}'] if uid_marks else []),
+        '    }',
+        '    map port_marks {',
+        '        type inet_service : mark',
+        *([f'        elements = {{ {port_marks} }}'] if port_marks else []),
+        '    }',
+        '    chain output {',
+        '        type route hook output priority mangle; policy accept;',
+        '        meta mark set meta skuid map @uid_marks',
+        '        meta l4proto { tcp, udp } meta mark set th sport map @port_marks',
+        f'        {save}',
+        '    }',
+        '    chain prerouting {',
+        '        type filter hook prerouting priority mangle; policy accept;',
+        '        meta l4proto { tcp, udp } meta mark set th dport map @port_marks',
+        f'        {save}',
+        '    }',
+        '}',
+    ]
+    return '\n'.join(lines) + '\n'
+
+
+def render_tc(rules, interface, ifb, link_mbps):
+    """tc batch; the initial deletes may fail and are run apart from the rest"""
+    lines = [
+        f'qdisc del dev {interface} root',
+        f'qdisc del dev {interface} ingress',
+        f'qdisc del dev {ifb} root',
+    ]
+    if not rules:
+        return '\n'.join(lines) + '\n'
+
+    for dev in (interface, ifb):
+        lines += [
+            f'qdisc add dev {dev} root handle 1: htb default {DEFAULT_MINOR:x}',
+            f'class add dev {dev} parent 1: classid 1:1 htb rate {link_mbps}mbit ceil {link_mbps}mbit',
+            f'class add dev {dev} parent 1:1 classid 1:{DEFAULT_MINOR:x} htb rate {link_mbps}mbit ceil {link_mbps}mbit',
+        ]
+        for rule in rules:
+            lines += [
+                f'class add dev {dev} parent 1:1 classid 1:{rule.minor:x} '
+                f'htb rate {rule.rate_mbps}mbit ceil {rule.rate_mbps}mbit',
+                f'qdisc add dev {dev} parent 1:{rule.minor:x} fq_codel',
+                f'filter add dev {dev} parent 1: protocol all prio 1 handle {rule.mark:#x} fw classid 1:{rule.minor:x}',
+            ]
+
+    # Ingress: restore the conntrack mark, then shape on the IFB device
+    lines += [
+        f'qdisc add dev {interface} handle ffff: ingress',
+        f'filter add dev {interface} parent ffff: protocol all prio 1 matchall '
+        f'action connmark action mirred egress redirect dev {ifb}',
+    ]
+    return '\n'.join(lines) + '\n'
+
+
+def render(rules, interface, ifb, link_mbps):
+    """Input for apply_shaping.sh: the nft ruleset, a '#### tc' line, the tc batch"""
+    return render_nft(rules) + '#### tc\n' + render_tc(rules, interface, ifb, link_mbps)
+
+
+def default_interface():
+    """Interface of the default route"""
+    success, output, _ = run_command(['ip', 'route', 'show', 'default'])
+    fields = output.split() if success else []
+    if 'dev' in fields[:-1]:
+        return fields[fields.index('dev') + 1]
+    return None
+
+
+def link_speed(interface):
+    """Speed of the interface in Mbit/s as reported by the driver, or None"""
+    try:
+        with open(SPEED_FILE.format(interface)) as f:
+            speed = int(f.read())
+    except (OSError, ValueError):
+        return None
+    return speed if speed > 0 else None
+
+
+def shaping_config(interface=None, link_mbps=None):
+    interface = interface or get_setting('shaping_interface', '') or default_interface()
+    return {
+        'interface': interface,
+        'ifb': get_setting('shaping_ifb', '') or DEFAULT_IFB,
+        'link_mbps': (link_mbps or int(get_setting('shaping_link_mbps', '') or 0)
+                      or (link_speed(interface) if interface else None)),
+    }
+
+
+def build_script(config):
+    """(rules, script) for the current database and system accounts"""
+    if not config['interface']:
+        raise ValueError('No network interface found, set shaping_interface')
+    if not config['link_mbps']:
+        # Guessing would cap a faster uplink (or leave a slower one unshaped)
+        raise ValueError(f"Link speed of {config['interface']} unknown, set shaping_link_mbps")
+    rules = collect_rules(read_uids())
+    return rules, render(rules, config['interface'], config['ifb'], config['link_mbps'])
+
+
+def apply_script(script, config):
+    """One apply_shaping.sh call; returns (success, output)"""
+    success, output, error = run_command([script_path('apply_shaping.sh'), config['ifb']],
+                                         timeout=120, input=script)
+    return success, output + error
+
+
+def apply_shaping():
+    """Re-apply shaping now; returns (success, output)"""
+    config = shaping_config()
+    try:
+        _, script = build_script(config)
+    except (OSError, ValueError) as e:
+        return False, str(e)
+    return apply_script(script, config)
+
+
+def sync_shaping():
+    """Re-apply shaping in the background after limits or shaped users changed"""
+    try:
+        config = shaping_config()
+        _, script = build_script(config)
+    except (OSError, ValueError) as e:
+        current_app.logger.error(f'Bandwidth shaping not applied: {e}')
+        return
+    # Applies never overlap, each one replaces the whole ruleset
+    sysexec.spawn([script_path('apply_shaping.sh'), config['ifb']], timeout=120, input=script,
+                  key='shaping', description='Apply bandwidth shaping')
+
+
+@click.command('shaping')
+@click.option('--dry-run', is_flag=True, help='Print the nft ruleset and tc batch instead of applying them')
+@click.option('--interface', help='Uplink interface (default: shaping_interface setting or default route)')
+@click.option('--link-mbps', type=int, help='Uplink speed for the unshaped default class '
+              '(default: shaping_link_mbps setting or the speed the driver reports)')
+def shaping_command(dry_run, interface, link_mbps):
+    """Apply per-user bandwidth limits (rate_limit_mbps) with nftables and tc"""
+    config = shaping_config(interface, link_mbps)
+    try:
+        rules, script = build_script(config)
+    except (OSError, ValueError) as e:
+        raise click.ClickException(str(e))
+
+    if dry_run:
+        click.echo(script, nl=False)
+        return
+    success, output = apply_script(script, config)
+    if output.strip():
+        click.echo(output.rstrip())
+    click.echo(f"{'Applied' if success else 'FAILED'}: {len(rules)} shaped users on {config['interface']}")
+    if not success:
+        raise SystemExit(1)
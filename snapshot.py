@@ -0,0 +1,284 @@
+from flask import current_app
+from models import db
+from functools import wraps
+import fcntl
+import hashlib
+import json
+import mmap
+import os
+import struct
+import threading
+import time
+
+# Snapshot cache shared by all worker processes. Each snapshot (system stats,
+# SSH connection stats, settings, ...) lives in its own memory-mapped file under
+# SNAPSHOT_DIR (/dev/shm by default). One process wins a flock on
+# producer.lock and refreshes the snapshots from a background thread; every
+# other process just reads the mapped file. The producer lock is released by
+# the kernel when its process dies, and the next reader that finds a stale
+# snapshot takes over. A reader never waits for the producer: if a snapshot is
+# missing, older than its max_age, or invalidated by a write, the reader
+# computes the value itself, the same as without the cache.
+#
+# File layout: a 64 byte header, then the JSON payload.
+#   seq          writes are bracketed by seq+1 (odd, write in progress) and seq+2
+#   generation   bumped by invalidate() from any process
+#   built_gen    generation the payload was computed for
+#   produced_at  time.time() of the payload
+#   read_at      last read by anyone; idle snapshots are not refreshed
+#   length       payload size
+HEADER = struct.Struct('<QQQddI')
+HEADER_SIZE = 64
+SEQ, GENERATION, BUILT_GEN, PRODUCED_AT, READ_AT, LENGTH = 0, 8, 16, 24, 32, 40
+
+INITIAL_SIZE = 64 * 1024
+PRODUCER_TICK = 0.5
+# Snapshots nobody asked for in this long are left alone by the producer
+IDLE_AFTER = 60
+# Stale readers try to take over as producer at most this often
+ELECTION_INTERVAL = 1.0
+
+MISSING = object()
+
+# name -> Snapshot, filled by @shared_snapshot
+SNAPSHOTS = {}
+
+
+class Snapshot:
+    def __init__(self, name, compute, interval, max_age):
+        self.name = name
+        self.compute = compute
+        self.interval = interval
+        self.max_age = max_age
+
+    def get(self):
+        store = get_store()
+        # A transaction that changed the underlying rows must see its own writes
+        if store is None or self.name in db.session.info.get('dirty_snapshots', ()):
+            return self.compute()
+        value = store.read(self.name, self.max_age)
+        if value is MISSING:
+            store.elect()
+            return self.compute()
+        return value
+
+
+def shared_snapshot(name, interval, max_age=None):
+    """Serve a zero-argument function from the shared snapshot cache.
+
+    The producer recomputes it every `interval` seconds while it is being read;
+    readers accept a snapshot up to `max_age` old (default 3 intervals). The
+    returned value is shared within the process, treat it as read-only.
+    """
+    def decorator(compute):
+        snapshot = Snapshot(name, compute, interval, max_age or interval * 3)
+        SNAPSHOTS[name] = snapshot
+
+        @wraps(compute)
+        def wrapper():
+            return snapshot.get()
+        wrapper.compute = compute
+        return wrapper
+    return decorator
+
+
+class SnapshotStore:
+    """Per-process view of the snapshot files in one directory"""
+
+    def __init__(self, directory, app):
+        self.directory = directory
+        self.app = app
+        self.pid = os.getpid()
+        self._maps = {}
+        self._decoded = {}  # name -> (seq, value), so unchanged snapshots are not re-parsed
+        self._lock = threading.Lock()
+        self._producer_lock = None
+        self._next_election = 0
+
+    def _map(self, name, min_size=0):
+        mm = self._maps.get(name)
+        if mm is not None and len(mm) >= min_size:
+            return mm
+        with self._lock:
+            fd = os.open(os.path.join(self.directory, f'{name}.snap'), os.O_RDWR | os.O_CREAT, 0o600)
+            try:
+                size = os.fstat(fd).st_size
+                wanted = max(min_size, INITIAL_SIZE)
+                if size < wanted:
+                    # Grow in powers of two; other processes remap when they see a longer payload
+                    size = 1 << (wanted - 1).bit_length()
+                    os.ftruncate(fd, size)
+                mm = mmap.mmap(fd, size)
+            finally:
+                os.close(fd)
+            self._maps[name] = mm
+            return mm
+
+    def read(self, name, max_age):
+        """Current value, or MISSING when absent, stale or invalidated"""
+        mm = self._map(name)
+        # Record the demand, an idle producer picks the snapshot up again
+        struct.pack_into('<d', mm, READ_AT, time.time())
+
+        for _ in range(3):
+            seq, generation, built_gen, produced_at, _, length = HEADER.unpack_from(mm)
+            if seq & 1:
+                # The producer is writing right now
+                time.sleep(0.001)
+                continue
+            if not produced_at:
+                return MISSING
+
+            decoded = self._decoded.get(name)
+            if decoded and decoded[0] == seq:
+                value = decoded[1]
+            else:
+                if HEADER_SIZE + length > len(mm):
+                    mm = self._map(name, HEADER_SIZE + length)
+                    continue
+                payload = mm[HEADER_SIZE:HEADER_SIZE + length]
+                if struct.unpack_from('<Q', mm, SEQ)[0] != seq:
+                    continue
+                try:
+                    value = json.loads(payload)
+                except ValueError:
+                    continue
+                self._decoded[name] = (seq, value)
+
+            if generation == built_gen and time.time() - produced_at <= max_age:
+                return value
+            return MISSING
+        return MISSING
+
+    def write(self, name, built_gen, value):
+        """Producer only: publish a new payload under the seqlock"""
+        payload = json.dumps(value, separators=(',', ':')).encode()
+        mm = self._map(name, HEADER_SIZE + len(payload))
+        seq = struct.unpack_from('<Q', mm, SEQ)[0]
+        # A producer that died mid-write leaves seq odd
+        seq = seq if seq & 1 else seq + 1
+        struct.pack_into('<Q', mm, SEQ, seq)
+        mm[HEADER_SIZE:HEADER_SIZE + len(payload)] = payload
+        struct.pack_into('<Q', mm, BUILT_GEN, built_gen)
+        struct.pack_into('<d', mm, PRODUCED_AT, time.time())
+        struct.pack_into('<I', mm, LENGTH, len(payload))
+        struct.pack_into('<Q', mm, SEQ, seq + 1)
+
+    def invalidate(self, name):
+        # Any new value will do, concurrent invalidations cannot cancel out
+        struct.pack_into('<Q', self._map(name), GENERATION, time.time_ns())
+
+    def elect(self):
+        """Become the producer if nobody holds producer.lock"""
+        if self._producer_lock is not None or time.monotonic() < self._next_election:
+            return
+        self._next_election = time.monotonic() + ELECTION_INTERVAL
+
+        lock_file = open(os.path.join(self.directory, 'producer.lock'), 'a')
+        try:
+            fcntl.flock(lock_file, fcntl.LOCK_EX | fcntl.LOCK_NB)
+        except OSError:
+            lock_file.close()
+            return
+        lock_file.truncate(0)
+        lock_file.write(str(os.getpid()))
+        lock_file.flush()
+        self._producer_lock = lock_file
+
+        self.app.logger.info(f'Snapshot producer elected (pid {os.getpid()})')
+        threading.Thread(target=self._produce, name='snapshot-producer', daemon=True).start()
+
+    def _produce(self):
+        while True:
+            now = time.time()
+            for name, snapshot in SNAPSHOTS.items():
+                mm = self._map(name)
+                _, generation, built_gen, produced_at, read_at, _ = HEADER.unpack_from(mm)
+                if now - read_at > IDLE_AFTER:
+                    continue
+                if generation == built_gen and now - produced_at < snapshot.interval:
+                    continue
+                try:
+                    with self.app.app_context():
+                        value = snapshot.compute()
+                    self.write(name, generation, value)
+                except Exception as e:
+                    self.app.logger.error(f'Snapshot {name} failed: {e}')
+            time.sleep(PRODUCER_TICK)
+
+
+_stores = {}
+
+
+def get_store():
+    """This process's store for the current app, None when snapshots are off"""
+    app = current_app._get_current_object()
+    if not app.config.get('SNAPSHOTS_ENABLED', True):
+        return None
+
+    # One directory per database, so separate panels on a host never mix
+    db_key = hashlib.sha1(app.config['SQLALCHEMY_DATABASE_URI'].encode()).hexdigest()[:12]
+    directory = os.path.join(app.config['SNAPSHOT_DIR'], db_key)
+    store = _stores.get(directory)
+    if store is not None and store.pid == os.getpid():
+        return store
+
+    # First use in this process (or after a fork): mappings and locks are not inherited
+    try:
+        os.makedirs(directory, mode=0o700, exist_ok=True)
+    except OSError as e:
+        app.logger.warning(f'Snapshot cache disabled, cannot use {directory}: {e}')
+        app.config['SNAPSHOTS_ENABLED'] = False
+        return None
+    store = SnapshotStore(directory, app)
+    _stores[directory] = store
+    store.elect()
+    return store
+
+
+def invalidate(name):
+    store = get_store()
+    if store is not None:
+        store.invalidate(name)
+
+
+# model -> snapshot names to invalidate when a transaction writing it commits
+_INVALIDATE_ON_WRITE = {}
+
+
+def invalidate_on_write(model, name):
+    _INVALIDATE_ON_WRITE.setdefault(model, set()).add(name)
+
+
+def _dirty_names(classes):
+    return {name for model, names in _INVALIDATE_ON_WRITE.items()
+            if any(issubclass(cls, model) for cls in classes) for name in names}
+
+
+@db.event.listens_for(db.session, 'after_flush')
+def _track_flush(session, flush_context):
+    names = _dirty_names({type(obj) for obj in (*session.new, *session.dirty, *session.deleted)})
+    if names:
+        session.info.setdefault('dirty_snapshots', set()).update(names)
+
+
+@db.event.listens_for(db.session, 'do_orm_execute')
+def _track_bulk(orm_execute_state):
+    if not (orm_execute_state.is_update or orm_execute_state.is_delete or orm_execute_state.is_insert):
+        return
+    mapper = orm_execute_state.bind_mapper
+    if mapper is not None:
+        names = _dirty_names({mapper.class_})
+        if names:
+            orm_execute_state.session.info.setdefault('dirty_snapshots', set()).update(names)
+
+
+@db.event.listens_for(db.session, 'after_commit')
+def _invalidate_committed(session):
+    for name in session.info.pop('dirty_snapshots', ()):
+        invalidate(name)
+
+
+@db.event.listens_for(db.session, 'after_rollback')
+def _forget_rolled_back(session):
+    session.info.pop('dirty_snapshots', None)
@@ -0,0 +1,125 @@
+from flask import current_app
+from models import db, SSHUser, VMessUser, OutlineUser, DashboardCounter
+from datetime import datetime, timedelta
+
+# Account types shown on the dashboard, keyed by the name stored in dashboard_counters
+ACCOUNT_MODELS = {
+    'ssh': SSHUser,
+    'vmess': VMessUser,
+    'outline': OutlineUser,
+}
+
+# get_status() values -> dashboard bucket
+STATUS_BUCKETS = {
+    'Active': 'active',
+    'Expired': 'expired',
+    'Disabled': 'disabled',
+    'Data Limit Exceeded': 'quota_exceeded',
+    'Quota Exceeded': 'quota_exceeded',
+}
+
+# Expiry depends on the clock, so counters are recomputed at least this often
+# even when nothing was written
+COUNTER_MAX_AGE = timedelta(seconds=60)
+
+
+def empty_stats():
+    return {kind: {'total': 0, 'active': 0, 'expired': 0, 'disabled': 0, 'quota_exceeded': 0}
+            for kind in ACCOUNT_MODELS}
+
+
+def status_counts_query(now):
+    """One UNION ALL statement grouping every account table by its SQL status"""
+    selects = []
+    for kind, model in ACCOUNT_MODELS.items():
+        status = model.status_expression(now)
+        selects.append(
+            db.select(db.literal(kind).label('account_type'),
+                      status.label('status'),
+                      db.func.count().label('count'))
+            .select_from(model)
+            .group_by(status)
+        )
+    return db.union_all(*selects)
+
+
+def _fold(rows):
+    """Turn (account_type, status, count) rows into the dashboard dict"""
+    stats = empty_stats()
+    for account_type, status, count in rows:
+        bucket = stats[account_type]
+        bucket['total'] += count
+        bucket[STATUS_BUCKETS[status]] += count
+    return stats
+
+
+def compute_stats(now=None):
+    """Aggregate all account types in a single grouped SQL pass"""
+    now = now or datetime.utcnow()
+    return _fold(db.session.execute(status_counts_query(now)).all())
+
+
+def refresh_counters(now=None):
+    """Recompute the materialized dashboard_counters table"""
+    now = now or datetime.utcnow()
+    rows = db.session.execute(status_counts_query(now)).all()
+
+    try:
+        db.session.execute(db.delete(DashboardCounter))
+        for kind in ACCOUNT_MODELS:
+            # Marker row so an empty table still counts as fresh
+            db.session.add(DashboardCounter(account_type=kind, status='', count=0, refreshed_at=now))
+        for account_type, status, count in rows:
+            db.session.add(DashboardCounter(account_type=account_type, status=status,
+                                            count=count, refreshed_at=now))
+        db.session.commit()
+    except Exception as e:
+        # Another worker refreshed at the same time, its rows are just as good
+        db.session.rollback()
+        current_app.logger.warning(f'Dashboard counter refresh failed: {e}')
+    return _fold(rows)
+
+
+def get_dashboard_stats():
+    """Dashboard counters; constant cost while the materialized rows are fresh"""
+    if not current_app.config.get('STATS_MATERIALIZED', True):
+        return compute_stats()
+
+    now = datetime.utcnow()
+    counters = DashboardCounter.query.all()
+    markers = {c.account_type: c.refreshed_at for c in counters if c.status == ''}
+
+    stale = (set(markers) != set(ACCOUNT_MODELS) or
+             any(now - refreshed_at > COUNTER_MAX_AGE for refreshed_at in markers.values()))
+    if stale:
+        return refresh_counters(now)
+
+    return _fold((c.account_type, c.status, c.count) for c in counters if c.status != '')
+
+
+def _touched_account_types(classes):
+    return {kind for kind, model in ACCOUNT_MODELS.items()
+            if any(issubclass(cls, model) for cls in classes)}
+
+
+@db.event.listens_for(db.session, 'after_flush')
+def _invalidate_on_flush(session, flush_context):
+    """Drop the counters of any account type written in this transaction"""
+    touched = _touched_account_types({type(obj) for obj in (*session.new, *session.dirty, *session.deleted)})
+    if touched:
+        session.execute(db.delete(DashboardCounter)
+                        .where(DashboardCounter.account_type.in_(touched)))
+
+
+@db.event.listens_for(db.session, 'do_orm_execute')
+def _invalidate_on_bulk(orm_execute_state):
+    """Set-based UPDATE/DELETE statements bypass the flush, catch them here"""
+    if not (orm_execute_state.is_update or orm_execute_state.is_delete):
+        return
+    mapper = orm_execute_state.bind_mapper
+    if mapper is None or mapper.class_ is DashboardCounter:
+        return
+    touched = _touched_account_types({mapper.class_})
+    if touched:
+        orm_execute_state.session.execute(
+            db.delete(DashboardCounter).where(DashboardCounter.account_type.in_(touched)))
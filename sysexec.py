@@ -0,0 +1,122 @@
+import asyncio
+import logging
+import os
+import threading
+
+# All host commands (scripts, systemctl, ss, who ...) run here: on one asyncio
+# loop per process via create_subprocess_exec with argument lists, never
+# through a shell. Request threads either wait for the result (run) or hand the
+# command off and return straight away (spawn), so a 15 s systemd start does
+# not pin a worker for 15 s.
+#
+# Spawned commands that share a key (e.g. 'xray') run one at a time, in the
+# order they were spawned. With coalesce=True a spawn that finds another run of
+# the key still waiting joins it instead of queueing one more: that run has not
+# started yet, so it will see the caller's committed changes too. A burst of
+# 100 VMess creates thus regenerates the Xray config at most twice.
+
+logger = logging.getLogger(__name__)
+
+DEFAULT_TIMEOUT = 30
+
+_loop = None
+_loop_pid = None
+_loop_lock = threading.Lock()
+
+# key -> asyncio.Lock, only used on the loop thread
+_key_locks = {}
+# key -> future of the run that is queued but not started (coalesce=True)
+_waiting = {}
+_waiting_lock = threading.Lock()
+
+
+def _get_loop():
+    """Background event loop for this process, restarted after fork"""
+    global _loop, _loop_pid
+    with _loop_lock:
+        if _loop is None or _loop_pid != os.getpid():
+            _loop = asyncio.new_event_loop()
+            _loop_pid = os.getpid()
+            _key_locks.clear()
+            _waiting.clear()
+            threading.Thread(target=_loop.run_forever, name='sysexec', daemon=True).start()
+        return _loop
+
+
+async def run_async(args, timeout=DEFAULT_TIMEOUT, input=None):
+    """Run a command, returns (success, stdout, stderr)"""
+    try:
+        proc = await asyncio.create_subprocess_exec(
+            *[str(arg) for arg in args],
+            stdin=asyncio.subprocess.PIPE if input is not None else asyncio.subprocess.DEVNULL,
+            stdout=asyncio.subprocess.PIPE,
+            stderr=asyncio.subprocess.PIPE,
+        )
+    except OSError as e:
+        return False, "", str(e)
+
+    try:
+        stdout, stderr = await asyncio.wait_for(
+            proc.communicate(input.encode() if input is not None else None), timeout)
+    except asyncio.TimeoutError:
+        proc.kill()
+        await proc.wait()
+        return False, "", f"{args[0]} timed out after {timeout}s"
+
+    return (proc.returncode == 0,
+            stdout.decode(errors='replace'),
+            stderr.decode(errors='replace'))
+
+
+def run(args, timeout=DEFAULT_TIMEOUT, input=None):
+    """Blocking wrapper around run_async for request threads"""
+    future = asyncio.run_coroutine_threadsafe(run_async(args, timeout, input), _get_loop())
+    try:
+        return future.result(timeout + 5)
+    except Exception as e:
+        return False, "", str(e)
+
+
+async def _run_serialized(key, args, timeout, input):
+    lock = _key_locks.setdefault(key, asyncio.Lock())
+    async with lock:
+        with _waiting_lock:
+            # Started: later spawns of the key queue behind this run
+            _waiting.pop(key, None)
+        return await run_async(args, timeout, input)
+
+
+def spawn(args, timeout=DEFAULT_TIMEOUT, input=None, description=None, key=None, coalesce=False):
+    """Start a command in the background and log its outcome.
+
+    Commands with the same key run one at a time; see the module comment for
+    coalesce. Returns a concurrent.futures.Future resolving to
+    (success, stdout, stderr).
+    """
+    description = description or ' '.join(str(arg) for arg in args)
+    if key is None:
+        future = asyncio.run_coroutine_threadsafe(run_async(args, timeout, input), _get_loop())
+    else:
+        loop = _get_loop()
+        # Held until the future is registered, so the run cannot start (and
+        # unregister itself) first
+        with _waiting_lock:
+            if coalesce and key in _waiting:
+                logger.info(f'{description}: merged into the queued run')
+                return _waiting[key]
+            future = asyncio.run_coroutine_threadsafe(_run_serialized(key, args, timeout, input), loop)
+            if coalesce:
+                _waiting[key] = future
+
+    def _log(done):
+        try:
+            success, _, stderr = done.result()
+        except Exception as e:
+            success, stderr = False, str(e)
+        if success:
+            logger.info(f'{description}: done')
+        else:
+            logger.error(f'{description}: failed: {stderr.strip()}')
+
+    future.add_done_callback(_log)
+    return future
@@ -0,0 +1,226 @@
+from flask import after_this_request, current_app, g, jsonify, request
+from models import db, ApiToken
+from snapshot import get_store
+from functools import wraps
+import click
+import fcntl
+import hashlib
+import mmap
+import os
+import secrets
+import struct
+import threading
+import time
+
+# API token authentication. Tokens are random, so a plain SHA-256 is enough to
+# store them and doubles as the lookup key. Lookups are cached in process memory
+# for TOKEN_CACHE_TTL seconds, so a busy token costs no database query per
+# request; a revoked token stops working once the cache entry expires.
+#
+# Rate limits are token buckets shared by all gunicorn workers: a memory-mapped
+# file next to the snapshot cache (/dev/shm) holds one fixed slot per token,
+# updated under a flock, so charging a request costs no database work. Tokens
+# whose ids share a slot (more than BUCKET_SLOTS tokens) reset each other's
+# bucket to full. With the snapshot cache disabled the buckets fall back to
+# process memory, where each worker enforces the limit on its own share.
+
+TOKEN_PREFIX = 'sp_'
+TOKEN_CACHE_TTL = 30
+TOKEN_CACHE_MAX = 10000
+
+BUCKET_FILE = 'api_rate_limits.bin'
+BUCKET_SLOTS = 4096
+# token id, level, last update (time.time(), shared between processes)
+BUCKET_SLOT = struct.Struct('<Qdd')
+
+
+def hash_token(token):
+    return hashlib.sha256(token.encode()).hexdigest()
+
+
+def create_token(name, rate_limit=600):
+    """Store a new token and return (record, plaintext); the plaintext is not kept"""
+    token = TOKEN_PREFIX + secrets.token_urlsafe(32)
+    record = ApiToken(name=name, token_hash=hash_token(token),
+                      prefix=token[:len(TOKEN_PREFIX) + 6], rate_limit=rate_limit)
+    db.session.add(record)
+    db.session.commit()
+    return record, token
+
+
+class TokenCache:
+    """{token hash: (token id, name, rate limit) or None} with a TTL"""
+
+    def __init__(self, ttl=TOKEN_CACHE_TTL):
+        self.ttl = ttl
+        self._entries = {}
+        self._lock = threading.Lock()
+
+    def lookup(self, token_hash):
+        now = time.monotonic()
+        entry = self._entries.get(token_hash)
+        if entry and entry[1] > now:
+            return entry[0]
+
+        row = db.session.execute(
+            db.select(ApiToken.id, ApiToken.name, ApiToken.rate_limit)
+            .where(ApiToken.token_hash == token_hash, ApiToken.is_active == True)
+        ).first()
+        # Unknown tokens are cached too, so guessing does not hit the database
+        value = tuple(row) if row else None
+        with self._lock:
+            if len(self._entries) >= TOKEN_CACHE_MAX:
+                self._entries.clear()
+            self._entries[token_hash] = (value, now + self.ttl)
+        return value
+
+    def clear(self):
+        with self._lock:
+            self._entries.clear()
+
+
+class RateLimiter:
+    """Token bucket per API token: `rate_limit` requests per minute, bursts up to that"""
+
+    def __init__(self):
+        self._local = {}
+        self._table = None  # (pid, path, fd, mmap)
+        self._lock = threading.Lock()
+
+    def _shared_table(self):
+        """(fd, mmap) of the bucket file for this process, None without the snapshot cache"""
+        store = get_store()
+        if store is None:
+            return None
+        path = os.path.join(store.directory, BUCKET_FILE)
+        table = self._table
+        if table is None or table[0] != os.getpid() or table[1] != path:
+            fd = os.open(path, os.O_RDWR | os.O_CREAT, 0o600)
+            size = BUCKET_SLOTS * BUCKET_SLOT.size
+            if os.fstat(fd).st_size < size:
+                # Zero slots are empty; growing it twice to the same size is harmless
+                os.ftruncate(fd, size)
+            table = self._table = (os.getpid(), path, fd, mmap.mmap(fd, size))
+        return table[2], table[3]
+
+    @staticmethod
+    def _charge(level, updated, now, rate_limit, cost):
+        """(new level, allowed, remaining, retry after) for a refilled bucket"""
+        refill = rate_limit / 60.0
+        level = min(rate_limit, level + max(0.0, now - updated) * refill)
+        if level >= cost:
+            return level - cost, True, int(level - cost), 0
+        return level, False, int(level), (cost - level) / refill if refill else 60
+
+    def take(self, token_id, rate_limit, cost=1):
+        """(allowed, remaining, seconds until `cost` requests fit)"""
+        now = time.time()
+        # flock is held per open file, the thread lock keeps this process's threads apart
+        with self._lock:
+            try:
+                table = self._shared_table()
+            except OSError as e:
+                current_app.logger.warning(f'Shared rate limits unavailable, using per-process buckets: {e}')
+                table = None
+
+            if table is None:
+                level, updated = self._local.get(token_id, (rate_limit, now))
+                level, allowed, remaining, retry_after = self._charge(level, updated, now, rate_limit, cost)
+                self._local[token_id] = (level, now)
+                return allowed, remaining, retry_after
+
+            fd, buckets = table
+            offset = token_id % BUCKET_SLOTS * BUCKET_SLOT.size
+            fcntl.flock(fd, fcntl.LOCK_EX)
+            try:
+                slot_id, level, updated = BUCKET_SLOT.unpack_from(buckets, offset)
+                if slot_id != token_id:
+                    level, updated = rate_limit, now
+                level, allowed, remaining, retry_after = self._charge(level, updated, now, rate_limit, cost)
+                BUCKET_SLOT.pack_into(buckets, offset, token_id, level, now)
+            finally:
+                fcntl.flock(fd, fcntl.LOCK_UN)
+            return allowed, remaining, retry_after
+
+
+token_cache = TokenCache()
+rate_limiter = RateLimiter()
+
+
+def api_error(message, status):
+    return jsonify({'error': message}), status
+
+
+def rate_limited(retry_after):
+    response, status = api_error('Rate limit exceeded', 429)
+    response.headers['Retry-After'] = str(int(retry_after) + 1)
+    return response, status
+
+
+def token_required(view):
+    """Authenticate `Authorization: Bearer <token>` and charge the rate limit"""
+    @wraps(view)
+    def wrapper(*args, **kwargs):
+        header = request.headers.get('Authorization', '')
+        if not header.startswith('Bearer '):
+            return api_error('Missing API token', 401)
+        try:
+            token = token_cache.lookup(hash_token(header[len('Bearer '):].strip()))
+        except db.exc.SQLAlchemyError as e:
+            current_app.logger.error(f'API token lookup failed: {e}')
+            return api_error('Token lookup failed, try again', 503)
+        if token is None:
+            return api_error('Invalid API token', 401)
+
+        token_id, name, rate_limit = token
+        allowed, remaining, retry_after = rate_limiter.take(token_id, rate_limit)
+        if not allowed:
+            return rate_limited(retry_after)
+
+        g.api_token_id = token_id
+        g.api_token_name = name
+        g.api_rate_limit = rate_limit
+
+        @after_this_request
+        def add_rate_limit_headers(response):
+            response.headers['X-RateLimit-Limit'] = str(rate_limit)
+            response.headers['X-RateLimit-Remaining'] = str(remaining)
+            return response
+
+        return view(*args, **kwargs)
+    return wrapper
+
+
+@click.group('api-token')
+def api_token_cli():
+    """Manage tokens for the JSON API"""
+
+
+@api_token_cli.command('create')
+@click.argument('name')
+@click.option('--rate-limit', default=600, show_default=True, help='Requests per minute')
+def create_token_command(name, rate_limit):
+    """Create a token; it is printed once and cannot be shown again"""
+    record, token = create_token(name, rate_limit)
+    click.echo(f'Created token #{record.id} "{name}" ({rate_limit}/min):')
+    click.echo(token)
+
+
+@api_token_cli.command('list')
+def list_tokens_command():
+    """List tokens"""
+    for record in db.session.scalars(db.select(ApiToken).order_by(ApiToken.id)):
+        state = 'active' if record.is_active else 'revoked'
+        click.echo(f'#{record.id:<4} {record.prefix}...  {record.rate_limit:>6}/min  {state:<8} {record.name}')
+
+
+@api_token_cli.command('revoke')
+@click.argument('token_id', type=int)
+def revoke_token_command(token_id):
+    """Revoke a token (running workers drop it within the cache TTL)"""
+    record = db.session.get(ApiToken, token_id)
+    if record is None:
+        raise click.ClickException(f'No token #{token_id}')
+    record.is_active = False
+    db.session.commit()
+    click.echo(f'Revoked token #{token_id} "{record.name}"')